@@ -2,15 +2,20 @@
 Primitive for Cloud-init VM on KVM hosts
 """
 # stdlib
+import shlex
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from copy import deepcopy
 from datetime import datetime
 from typing import Any, Dict, List, Tuple
 # lib
-from cloudcix.rcc import CHANNEL_SUCCESS, comms_ssh
+from cloudcix.rcc import CHANNEL_SUCCESS, CONNECTION_ERROR, RESPONSE_DICT
 # local
 from .controllers import KVMInterface
 from cloudcix_primitives.utils import (
+    comms_ssh_tuned,
     HostErrorFormatter,
+    SSH_COMMAND_TIMEOUT,
     SSHCommsWrapper,
 )
 
@@ -23,6 +28,42 @@ __all__ = [
 ]
 
 SUCCESS_CODE = 0
+PAYLOAD_CHANNELS = {'payload_message': 'STDOUT', 'payload_error': 'STDERR'}
+
+# virt-install options that are identical for every domain, joined once at import time
+VIRT_INSTALL_CMD = ' '.join([
+    'virt-install',
+    # When KVM host reboots, then VM starts if it was running before KVM host was rebooted
+    '--autostart',
+    # To view the VM via Virt Manager
+    '--graphics vnc',
+    # To boot as UEFI, a modern firmware interface
+    '--boot uefi',
+    # To import an existing disk image(cloud image),for Non .ISO installations
+    '--import',
+    # Virt-install automatically connects to the guest VM console for any interactions and waits until VM is reboots
+    # Don't automatically try to connect to the guest console. The VM will be created without asking for any
+    # interaction and 'virt-install' will exit quickly.
+    '--noautoconsole',
+    # cloudinit datasource
+    '--sysinfo smbios,system.product=CloudCIX',
+])
+
+
+def _future_result(future, host):
+    """
+    Returns the RCC response dict of a payload run through future, or a CONNECTION_ERROR response if it did not
+    finish within SSH_COMMAND_TIMEOUT seconds.
+    """
+    try:
+        return future.result(timeout=SSH_COMMAND_TIMEOUT)
+    except FutureTimeoutError:
+        response = deepcopy(RESPONSE_DICT)
+        response['channel_code'] = CONNECTION_ERROR
+        response['channel_message'] = (
+            f'Timed out after {SSH_COMMAND_TIMEOUT} seconds waiting for the payload to finish on {host}.'
+        )
+        return response
 
 
 def build(
@@ -38,6 +79,7 @@ def build(
         secondary_interfaces=None,
         secondary_storages=None,
         osvariant='generic',
+        backing_file=False,
 ) -> Tuple[bool, str]:
     """
     description:
@@ -45,6 +87,9 @@ def build(
         2. Resizes the storage file to <size>
         3. Creates a Cloud-init VM
 
+        If <backing_file> is True and <primary_storage> is a .qcow2 file, steps 1 and 2 are
+        replaced by creating a <size> qcow2 overlay that uses <cloudimage> as its backing file.
+
     parameters:
         cloudimage:
             description: The path to the cloud image file that will be copied to the domain directory.
@@ -136,6 +181,13 @@ def build(
                 e.g 'ubuntu24.04', 'rhel9.0'
             type: string
             required: false
+        backing_file:
+            description: |
+                Create the primary storage as a qcow2 overlay backed by <cloudimage> instead of copying
+                <cloudimage>. Only applies to a .qcow2 primary_storage and requires <cloudimage> to be a
+                qcow2 image that stays in place for the lifetime of the domain. Defaults to False.
+            type: boolean
+            required: false
     return:
         description: |
             A tuple with a boolean flag stating the build was successful or not and
@@ -158,7 +210,7 @@ def build(
         3020: 'Invalid "secondary_storages", every item in "secondary_storages" must be of string type',
         3021: 'Invalid "secondary_storages", one or more items are invalid, Errors: ',
         # payload execution
-        3031: f'Failed to connect to the host {host} for the payload read_storage_file',
+        3031: f'Failed to connect to the host {host} for the payload read_domain_id',
         3032: f'Failed to create domain, the requested domain {domain} already exists on the Host {host}',
         3033: f'Failed to connect the Host {host} for the payload copy_cloudimage',
         3034: f'Failed to copy cloud image {cloudimage} to the domain directory {domain_path}{primary_storage}'
@@ -166,7 +218,10 @@ def build(
         3035: f'Failed to connect the Host {host} for the payload resize_copied_file',
         3036: f'Failed to resize the copied storage image to {size}GB on Host {host}',
         3037: f'Failed to connect the Host {host} for the payload virt_install_cmd',
-        3038: f'Failed to create domain {domain} on Host {host}'
+        3038: f'Failed to create domain {domain} on Host {host}',
+        3039: f'Failed to connect the Host {host} for the payload create_overlay',
+        3040: f'Failed to create {size}GB overlay {domain_path}{primary_storage} backed by cloud image {cloudimage}'
+              f' on Host {host}',
     }
 
     # domain_path defaults to /var/lib/libvirt/images/
@@ -175,6 +230,9 @@ def build(
 
     messages_list = []
     validated = True
+    # virt-install arguments for secondary storages and interfaces, collected while validating them
+    secondary_disk_args = []
+    secondary_network_args = []
 
     # validate gateway_interface
     def validate_gateway_interface(gif, msg_index):
@@ -183,7 +241,7 @@ def build(
             messages_list.append(f'{messages[msg_index]}: {messages[msg_index]}')
             return False
 
-        if type(gif) is not dict:
+        if not isinstance(gif, dict):
             messages_list.append(f'{messages[msg_index + 1]}: {messages[msg_index + 1]}')
             return False
 
@@ -201,7 +259,7 @@ def build(
         if ps is None:
             messages_list.append(f'{messages[msg_index]}: {messages[msg_index]}')
             return False
-        if type(primary_storage) is not str:
+        if not isinstance(ps, str):
             messages_list.append(f'{messages[msg_index + 1]}: {messages[msg_index + 1]}')
             return False
 
@@ -218,18 +276,23 @@ def build(
 
     # validate secondary interfaces
     def validate_secondary_interfaces(sifs, msg_index):
-        if type(sifs) is not list:
+        if not isinstance(sifs, list):
             messages_list.append(f'{messages[msg_index]}: {messages[msg_index]}')
             return False
 
         errors = []
         valid_sifs = True
-        for interface in secondary_interfaces:
+        for interface in sifs:
             controller = KVMInterface(interface)
             success, errs = controller()
             if success is False:
                 valid_sifs = False
                 errors.extend(errs)
+            else:
+                secondary_network_args.extend([
+                    '--network',
+                    f'bridge={interface["vlan_bridge"]},model=virtio,mac={interface["mac_address"]}',
+                ])
         if valid_sifs is False:
             messages_list.append(f'{messages[msg_index + 1]}: {messages[msg_index + 1]} {";".join(errors)}')
 
@@ -237,19 +300,17 @@ def build(
 
     if secondary_interfaces:
         validated = validate_secondary_interfaces(secondary_interfaces, 3018)
-    else:
-        secondary_interfaces = []
 
     # validate secondary storages
     def validate_secondary_storages(sstgs, msg_index):
-        if type(sstgs) is not list:
+        if not isinstance(sstgs, list):
             messages_list.append(f'{messages[msg_index]}: {messages[msg_index]}')
             return False
 
         errors = []
         valid_sstgs = True
-        for storage in secondary_storages:
-            if type(storage) is not str:
+        for storage in sstgs:
+            if not isinstance(storage, str):
                 errors.append(f'Invalid secondary_storage {storage}, it must be string type')
                 valid_sstgs = False
             else:
@@ -264,6 +325,8 @@ def build(
                         f'Invalid secondary_storage {storage}, it can only be either .img or .qcow2 file format',
                     )
                     valid_sstgs = False
+                else:
+                    secondary_disk_args.extend(['--disk', f'path={domain_path}{storage},device=disk,bus=virtio'])
 
         if valid_sstgs is False:
             messages_list.append(f'{messages[msg_index + 1]}: {messages[msg_index + 1]} {";".join(errors)}')
@@ -272,86 +335,76 @@ def build(
 
     if secondary_storages:
         validated = validate_secondary_storages(secondary_storages, 3020)
-    else:
-        secondary_storages = []
 
     if validated is False:
         return False, '; '.join(messages_list)
 
     def run_host(host, prefix, successful_payloads):
-        rcc = SSHCommsWrapper(comms_ssh, host, 'robot')
-        fmt = HostErrorFormatter(
-            host,
-            {'payload_message': 'STDOUT', 'payload_error': 'STDERR'},
-            successful_payloads
-        )
-
-        #  define virt install payload
-        cmd = 'virt-install '
-        # When KVM host reboots, then VM starts if it was running before KVM host was rebooted
-        cmd += '--autostart '
-        # To view the VM via Virt Manager
-        cmd += '--graphics vnc '
-        # To boot as UEFI, a modern firmware interface
-        cmd += '--boot uefi '
-        # To import an existing disk image(cloud image),for Non .ISO installations
-        cmd += '--import '
-        # Virt-install automatically connects to the guest VM console for any interactions and waits until VM is reboots
-        # Don't automatically try to connect to the guest console. The VM will be created without asking for any
-        # interaction and 'virt-install' will exit quickly.
-        cmd += '--noautoconsole '
-        # cloudinit datasource
-        cmd += '--sysinfo smbios,system.product=CloudCIX '
-        # name
-        cmd += f'--name {domain} '
-        # ram
-        cmd += f'--memory {ram} '
-        # cpu
-        cmd += f'--vcpus {cpu} '
-        # os variant
-        cmd += f'--os-variant {osvariant} '
-        # primary storage
-        cmd += f'--disk path="{domain_path}{primary_storage},device=disk,bus=virtio" '
+        rcc = SSHCommsWrapper(comms_ssh_tuned, host, 'robot')
+        fmt = HostErrorFormatter(host, PAYLOAD_CHANNELS, successful_payloads)
+
+        #  define virt install payload, only the domain specific arguments need quoting
+        virt_install_args = [
+            '--name', domain,
+            '--memory', str(ram),
+            '--vcpus', str(cpu),
+            '--os-variant', osvariant,
+            # primary storage
+            '--disk', f'path={domain_path}{primary_storage},device=disk,bus=virtio',
+        ]
         # secondary storages
-        for storage in secondary_storages:
-            cmd += f'--disk path="{domain_path}{storage},device=disk,bus=virtio" '
+        virt_install_args.extend(secondary_disk_args)
         # gateway interface
-        cmd += f'--network bridge={gateway_interface["vlan_bridge"]},'
-        cmd += f'model=virtio,mac={gateway_interface["mac_address"]} '
+        virt_install_args.extend([
+            '--network',
+            f'bridge={gateway_interface["vlan_bridge"]},model=virtio,mac={gateway_interface["mac_address"]}',
+        ])
         # secondary interface
-        for interface in secondary_interfaces:
-            cmd += f'--network bridge={interface["vlan_bridge"]},model=virtio,mac={interface["mac_address"]}'
+        virt_install_args.extend(secondary_network_args)
+        # quote every argument so the remote shell passes them to virt-install verbatim
+        cmd = VIRT_INSTALL_CMD + ' ' + ' '.join(shlex.quote(arg) for arg in virt_install_args)
 
         payloads = {
-            # check if vm exists already
-            'read_domain_info': f'virsh dominfo {domain} ',
-            'copy_cloudimage': f'cp {cloudimage} {domain_path}{primary_storage}',
+            # check if vm exists already, domid exits non-zero only for unknown domains
+            'read_domain_id': f'virsh domid {domain}',
+            # --reflink=auto clones the extents on CoW filesystems (btrfs, xfs) and falls back to a full copy
+            'copy_cloudimage': f'cp --reflink=auto {cloudimage} {domain_path}{primary_storage}',
             'resize_copied_file': f'qemu-img resize {domain_path}{primary_storage} {size}G',
+            'create_overlay': f'qemu-img create -f qcow2 -F qcow2 -b {cloudimage} {domain_path}{primary_storage} {size}G',
             'virt_install_cmd': cmd,
         }
 
-        ret = rcc.run(payloads['read_domain_info'])
+        ret = rcc.run(payloads['read_domain_id'])
         if ret["channel_code"] != CHANNEL_SUCCESS:
             return False, fmt.channel_error(ret, f'{prefix + 1}: {messages[prefix + 1]}'), fmt.successful_payloads
         if ret["payload_code"] == SUCCESS_CODE:
             # if vm exists already then we should not build it again,
             # by mistake same vm is requested to build again so return with error
             return False, fmt.payload_error(ret, f'{prefix + 2}: {messages[prefix + 2]}'), fmt.successful_payloads
-        fmt.add_successful('read_domain_info', ret)
+        fmt.add_successful('read_domain_id', ret)
 
-        ret = rcc.run(payloads['copy_cloudimage'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f'{prefix + 3}: {messages[prefix + 3]}'), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f'{prefix + 4}: {messages[prefix + 4]}'), fmt.successful_payloads
-        fmt.add_successful('copy_cloudimage', ret)
+        if backing_file is True and primary_storage.endswith('.qcow2'):
+            # overlay is created at its final size, no copy or resize required
+            ret = rcc.run(payloads['create_overlay'])
+            if ret["channel_code"] != CHANNEL_SUCCESS:
+                return False, fmt.channel_error(ret, f'{prefix + 9}: {messages[prefix + 9]}'), fmt.successful_payloads
+            if ret["payload_code"] != SUCCESS_CODE:
+                return False, fmt.payload_error(ret, f'{prefix + 10}: {messages[prefix + 10]}'), fmt.successful_payloads
+            fmt.add_successful('create_overlay', ret)
+        else:
+            ret = rcc.run(payloads['copy_cloudimage'])
+            if ret["channel_code"] != CHANNEL_SUCCESS:
+                return False, fmt.channel_error(ret, f'{prefix + 3}: {messages[prefix + 3]}'), fmt.successful_payloads
+            if ret["payload_code"] != SUCCESS_CODE:
+                return False, fmt.payload_error(ret, f'{prefix + 4}: {messages[prefix + 4]}'), fmt.successful_payloads
+            fmt.add_successful('copy_cloudimage', ret)
 
-        ret = rcc.run(payloads['resize_copied_file'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f'{prefix + 5}: {messages[prefix + 5]}'), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f'{prefix + 6}: {messages[prefix + 6]}'), fmt.successful_payloads
-        fmt.add_successful('resize_copied_file', ret)
+            ret = rcc.run(payloads['resize_copied_file'])
+            if ret["channel_code"] != CHANNEL_SUCCESS:
+                return False, fmt.channel_error(ret, f'{prefix + 5}: {messages[prefix + 5]}'), fmt.successful_payloads
+            if ret["payload_code"] != SUCCESS_CODE:
+                return False, fmt.payload_error(ret, f'{prefix + 6}: {messages[prefix + 6]}'), fmt.successful_payloads
+            fmt.add_successful('resize_copied_file', ret)
 
         ret = rcc.run(payloads['virt_install_cmd'])
         if ret["channel_code"] != CHANNEL_SUCCESS:
@@ -402,12 +455,8 @@ def quiesce(domain: str, host: str) -> Tuple[bool, str]:
     }
 
     def run_host(host, prefix, successful_payloads):
-        rcc = SSHCommsWrapper(comms_ssh, host, 'robot')
-        fmt = HostErrorFormatter(
-            host,
-            {'payload_message': 'STDOUT', 'payload_error': 'STDERR'},
-            successful_payloads
-        )
+        rcc = SSHCommsWrapper(comms_ssh_tuned, host, 'robot')
+        fmt = HostErrorFormatter(host, PAYLOAD_CHANNELS, successful_payloads)
 
         payloads = {
             'read_domstate_0': f'virsh domstate {domain} ',
@@ -424,7 +473,7 @@ def quiesce(domain: str, host: str) -> Tuple[bool, str]:
         if ret["payload_code"] != SUCCESS_CODE:
             return False, fmt.payload_error(ret, f'{prefix + 2}: {messages[prefix + 2]}'), fmt.successful_payloads
         else:
-            if 'shut off' in ret["payload_message"].strip():
+            if 'shut off' in ret["payload_message"]:
                 quiesced = True
         fmt.add_successful('read_domstate_0', ret)
 
@@ -454,7 +503,7 @@ def quiesce(domain: str, host: str) -> Tuple[bool, str]:
                     ret, f'{prefix + 6}: Attempt #{attempt}-{messages[prefix + 6]}'
                 ), fmt.successful_payloads
             else:
-                if 'shut off' in ret["payload_message"].strip():
+                if 'shut off' in ret["payload_message"]:
                     shutoff = True
                 else:
                     # wait interval is 0.5 seconds
@@ -536,12 +585,8 @@ def read(
 
     def run_host(host, prefix, successful_payloads):
         retval = True
-        rcc = SSHCommsWrapper(comms_ssh, host, 'robot')
-        fmt = HostErrorFormatter(
-            host,
-            {'payload_message': 'STDOUT', 'payload_error': 'STDERR'},
-            successful_payloads
-        )
+        rcc = SSHCommsWrapper(comms_ssh_tuned, host, 'robot')
+        fmt = HostErrorFormatter(host, PAYLOAD_CHANNELS, successful_payloads)
 
         payloads = {
             'read_domain_info': f'virsh dominfo {domain} ',
@@ -605,12 +650,8 @@ def restart(
     }
 
     def run_host(host, prefix, successful_payloads):
-        rcc = SSHCommsWrapper(comms_ssh, host, 'robot')
-        fmt = HostErrorFormatter(
-            host,
-            {'payload_message': 'STDOUT', 'payload_error': 'STDERR'},
-            successful_payloads
-        )
+        rcc = SSHCommsWrapper(comms_ssh_tuned, host, 'robot')
+        fmt = HostErrorFormatter(host, PAYLOAD_CHANNELS, successful_payloads)
 
         payloads = {
             'read_domstate_0': f'virsh domstate {domain} ',
@@ -626,7 +667,7 @@ def restart(
         if ret["payload_code"] != SUCCESS_CODE:
             fmt.payload_error(ret, f'{prefix + 2}: {messages[prefix + 2]}'), fmt.successful_payloads
         else:
-            if 'running' in ret["payload_message"].strip():
+            if 'running' in ret["payload_message"]:
                 running = True
         fmt.add_successful('read_domstate_0', ret)
 
@@ -652,7 +693,7 @@ def restart(
             if ret["payload_code"] != SUCCESS_CODE:
                 fmt.payload_error(ret, f'{prefix + 6}: Attempt #{attempt}-{messages[prefix + 6]}'), fmt.successful_payloads
             else:
-                if 'running' in ret["payload_message"].strip():
+                if 'running' in ret["payload_message"]:
                     running = True
                 else:
                     # wait interval is 0.5 seconds
@@ -726,12 +767,8 @@ def scrub(
         domain_path = '/var/lib/libvirt/images/'
 
     def run_host(host, prefix, successful_payloads):
-        rcc = SSHCommsWrapper(comms_ssh, host, 'robot')
-        fmt = HostErrorFormatter(
-            host,
-            {'payload_message': 'STDOUT', 'payload_error': 'STDERR'},
-            successful_payloads
-        )
+        rcc = SSHCommsWrapper(comms_ssh_tuned, host, 'robot')
+        fmt = HostErrorFormatter(host, PAYLOAD_CHANNELS, successful_payloads)
 
         payloads = {
             'read_domstate': f'virsh domstate {domain} ',
@@ -742,15 +779,15 @@ def scrub(
 
         ret = rcc.run(payloads['read_domstate'])
         if ret["channel_code"] != CHANNEL_SUCCESS:
-            fmt.channel_error(ret, f'{prefix + 1}: {messages[prefix + 1]}'), fmt.successful_payloads
+            return False, fmt.channel_error(ret, f'{prefix + 1}: {messages[prefix + 1]}'), fmt.successful_payloads
         shutoff = False
         if ret["payload_code"] != SUCCESS_CODE:
             # check if already undefined/remove
-            if f'failed to get domain \'{domain}\'' in ret["payload_error"].strip():
+            if f'failed to get domain \'{domain}\'' in ret["payload_error"]:
                 return True, "", fmt.successful_payloads
-            fmt.payload_error(ret, f'{prefix + 2}: {messages[prefix + 2]}'), fmt.successful_payloads
+            return False, fmt.payload_error(ret, f'{prefix + 2}: {messages[prefix + 2]}'), fmt.successful_payloads
         else:
-            if 'shut off' in ret["payload_message"].strip():
+            if 'shut off' in ret["payload_message"]:
                 shutoff = True
         fmt.add_successful('read_domstate', ret)
 
@@ -762,14 +799,27 @@ def scrub(
                 return False, fmt.payload_error(ret, f'{prefix + 4}: {messages[prefix + 4]}'), fmt.successful_payloads
             fmt.add_successful('destroy_domain', ret)
 
-        ret = rcc.run(payloads['undefine_domain'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f'{prefix + 5}: {messages[prefix + 5]}'), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
+        # The domain is stopped at this point, so undefining it (libvirt state) and removing its primary storage
+        # (filesystem) are independent and run concurrently, each over its own connection.
+        executor = ThreadPoolExecutor(max_workers=2)
+        undefine = executor.submit(rcc.run, payloads['undefine_domain'])
+        remove = executor.submit(rcc.run, payloads['remove_primary_storage'])
+        undefine_ret = _future_result(undefine, host)
+        remove_ret = _future_result(remove, host)
+        # a payload that timed out is left running rather than waited for
+        executor.shutdown(wait=False)
+
+        ret = undefine_ret
+        if ret["channel_code"] != CHANNEL_SUCCESS or ret["payload_code"] != SUCCESS_CODE:
+            # the removal ran regardless, so it is reported as done even though the undefine failed
+            if remove_ret["channel_code"] == CHANNEL_SUCCESS and remove_ret["payload_code"] == SUCCESS_CODE:
+                fmt.add_successful('remove_primary_storage', remove_ret)
+            if ret["channel_code"] != CHANNEL_SUCCESS:
+                return False, fmt.channel_error(ret, f'{prefix + 5}: {messages[prefix + 5]}'), fmt.successful_payloads
             return False, fmt.payload_error(ret, f'{prefix + 6}: {messages[prefix + 6]}'), fmt.successful_payloads
         fmt.add_successful('undefine_domain', ret)
 
-        ret = rcc.run(payloads['remove_primary_storage'])
+        ret = remove_ret
         if ret["channel_code"] != CHANNEL_SUCCESS:
             return False, fmt.channel_error(ret, f'{prefix + 7}: {messages[prefix + 7]}'), fmt.successful_payloads
         if ret["payload_code"] != SUCCESS_CODE:
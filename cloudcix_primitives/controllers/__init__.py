@@ -1,4 +1,4 @@
-from .firewall_main import FirewallPodNet
+from .firewall_podnet import FirewallPodNet
 from .cloudinit_kvm import KVMInterface
 
 __all__ = [
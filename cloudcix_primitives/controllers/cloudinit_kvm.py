@@ -1,34 +1,47 @@
 # stdlib
-import re
+from functools import lru_cache
 # local
 from cloudcix_primitives.controllers.exceptions import (
-    exception_handler,
     InvalidKVMInterfaceItem,
     InvalidKVMInterfaceMacAddress,
     InvalidKVMInterfaceVlanBridge,
 )
+from cloudcix_primitives.controllers.validators import is_valid_mac, is_valid_vlan_bridge
 
 
 __all__ = ['KVMInterface']
 
+# The interface fields KVMInterface validates, the only ones its result depends on
+VALIDATED_FIELDS = ('mac_address', 'vlan_bridge')
 
-def is_valid_mac(mac_address):
-    # Define the regex pattern for MAC addresses
-    pattern = r'^([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})$'
 
-    # Use fullmatch to check if the entire string matches the pattern, if not matches result is None
-    return re.fullmatch(pattern, mac_address) is not None
+def _frozen_interface(interface):
+    """
+    Returns a hashable key of interface's VALIDATED_FIELDS to cache its validation under, each value tagged with its
+    type, so values that compare equal but are reported differently, such as True and 1, do not share a key.
+    Returns None if some value cannot be hashed.
+    """
+    frozen = tuple((field, type(interface.get(field)), interface.get(field)) for field in VALIDATED_FIELDS)
+    try:
+        hash(frozen)
+    except TypeError:
+        return None
+    return frozen
 
 
-def is_valid_vlan_bridge(vlan_bridge):
-    # Define the regex pattern for VLAN bridges
-    pattern = r'^br\d{4}$'
-
-    # Use fullmatch to check if the entire string matches the pattern, if not matches result is None
-    return re.fullmatch(pattern, vlan_bridge) is not None
+@lru_cache(maxsize=4096)
+def _validate_frozen_interface(frozen):
+    """
+    Returns the errors of the interface frozen by _frozen_interface(). Many domains repeat the same interfaces, so
+    each distinct one is only checked once per process, the LRU bound keeping the cache from growing with every
+    interface ever seen.
+    """
+    return KVMInterface({field: value for field, _, value in frozen})._errors()
 
 
 class KVMInterface:
+    __slots__ = ('interface', 'success', 'errors')
+
     interface: dict
     success: bool
     errors: list
@@ -39,31 +52,35 @@ class KVMInterface:
         self.errors = []
 
     def __call__(self):
-        validators = [
-            self._validate_mac_address,
-            self._validate_vlan_bridge,
-        ]
-
-        for validator in validators:
-            error = validator()
-            if error is not None:
-                self.success = False
-                self.errors.append(str(error))
-
+        frozen = _frozen_interface(self.interface)
+        # unhashable values cannot be valid anyway, they are validated without caching
+        errors = self._errors() if frozen is None else _validate_frozen_interface(frozen)
+        self.success = not errors
+        self.errors = list(errors)
         return self.success, self.errors
 
-    @exception_handler
+    def _errors(self):
+        return tuple(
+            error
+            for error in (
+                self._validate_mac_address(),
+                self._validate_vlan_bridge(),
+            )
+            if error is not None
+        )
+
     def _validate_mac_address(self):
         mac_address = self.interface.get('mac_address', None)
         if mac_address is None:
-            raise InvalidKVMInterfaceItem('mac_address')
+            return str(InvalidKVMInterfaceItem('mac_address'))
         if is_valid_mac(mac_address) is False:
-            raise InvalidKVMInterfaceMacAddress(mac_address)
+            return str(InvalidKVMInterfaceMacAddress(mac_address))
+        return None
 
-    @exception_handler
     def _validate_vlan_bridge(self):
         vlan_bridge = self.interface.get('vlan_bridge', None)
         if vlan_bridge is None:
-            raise InvalidKVMInterfaceItem('vlan_bridge')
+            return str(InvalidKVMInterfaceItem('vlan_bridge'))
         if is_valid_vlan_bridge(vlan_bridge) is False:
-            raise InvalidKVMInterfaceVlanBridge(vlan_bridge)
+            return str(InvalidKVMInterfaceVlanBridge(vlan_bridge))
+        return None
@@ -1,163 +1,88 @@
-def exception_handler(func):
-    def wrapper(*args, **kwargs):
-        try:
-            return func(*args, **kwargs)
-        except BaseException as e:
-            return str(e)
-    return wrapper
-
-
-class InvalidFirewallRuleAction(BaseException):
-    def __init__(self, obj):
-        super().__init__(obj)
-        self.obj = obj
-
-    def __str__(self):
-        return f'Invalid firewall rule action, Value: {self.obj}'
-
-
-class InvalidFirewallRuleDestination(BaseException):
-    def __init__(self, obj):
-        super().__init__(obj)
-        self.obj = obj
-
-    def __str__(self):
-        return f'Invalid firewall rule destination, Value: {self.obj}'
-
-
-class InvalidFirewallRuleDestinationType(BaseException):
-    def __init__(self, obj):
-        super().__init__(obj)
-        self.obj = obj
-
-    def __str__(self):
-        return f'Invalid firewall rule destination type, Value: {self.obj} is not a list'
-
-
-class InvalidFirewallRuleDestinationEmpty(BaseException):
-    def __init__(self, obj):
-        super().__init__(obj)
-        self.obj = obj
-
-    def __str__(self):
-        return f'Invalid firewall rule destination, it cannot be empty list: {self.obj}'
-
-
-class InvalidFirewallRuleIPAddress(BaseException):
-    def __init__(self, obj):
-        super().__init__(obj)
-        self.obj = obj
-
-    def __str__(self):
-        return f'Invalid firewall rule IP address, Value: {self.obj} is not a valid CIDR IP'
-
-
-class InvalidFirewallRulePort(BaseException):
-    def __init__(self, obj):
-        super().__init__(obj)
-        self.obj = obj
-
-    def __str__(self):
-        return f'Invalid firewall rule port, Value: {self.obj}'
-
-
-class InvalidFirewallRuleProtocol(BaseException):
-    def __init__(self, obj):
-        super().__init__(obj)
-        self.obj = obj
-
-    def __str__(self):
-        return f'Invalid firewall rule protocol, Value: {self.obj}'
-
-
-class InvalidFirewallRuleSingular(BaseException):
-    def __init__(self, obj):
-        super().__init__(obj)
-        self.obj = obj
-
-    def __str__(self):
-        msg = f'Invalid firewall rule, Value: {self.obj}, When `any` or `@` is used Only one item is allowed per list'
-        return msg
-
-
-class InvalidFirewallRuleSource(BaseException):
-    def __init__(self, obj):
-        super().__init__(obj)
-        self.obj = obj
-
-    def __str__(self):
-        return f'Invalid firewall rule source, Value: {self.obj}'
-
-
-class InvalidFirewallRuleSourceType(BaseException):
-    def __init__(self, obj):
-        super().__init__(obj)
-        self.obj = obj
-
-    def __str__(self):
-        return f'Invalid firewall rule source type, Value: {self.obj} is not a list'
-
-
-class InvalidFirewallRuleSourceEmpty(BaseException):
-    def __init__(self, obj):
-        super().__init__(obj)
-        self.obj = obj
-
-    def __str__(self):
-        return f'Invalid firewall rule source, it cannot be empty list: {self.obj}'
-
-
-class InvalidFirewallRuleItem(BaseException):
-    def __init__(self, obj):
-        super().__init__(obj)
-        self.obj = obj
-
-    def __str__(self):
-        return f'Invalid firewall rule, field: {self.obj} is missing in the rule object'
-
-
-class InvalidFirewallRuleType(BaseException):
-    def __init__(self, obj):
-        super().__init__(obj)
-        self.obj = obj
-
-    def __str__(self):
-        return f'Invalid firewall rule type, Value: {self.obj}'
-
-
-class InvalidFirewallRuleVersion(BaseException):
-    def __init__(self, obj):
-        super().__init__(obj)
-        self.obj = obj
-
-    def __str__(self):
-        return f'Invalid firewall rule version, Value: {self.obj}'
-
-
-class InvalidKVMInterfaceItem(BaseException):
-    def __init__(self, obj):
-        super().__init__(obj)
-        self.obj = obj
-
-    def __str__(self):
-        return f'Invalid KVM Interface, field: {self.obj} is missing in the Interface object'
-
-
-class InvalidKVMInterfaceMacAddress(BaseException):
-    def __init__(self, obj):
-        super().__init__(obj)
-        self.obj = obj
-
-    def __str__(self):
-        return f'Invalid KVM Interface property mac_address: {self.obj}, The property is not a valid Mac Address'
-
-
-class InvalidKVMInterfaceVlanBridge(BaseException):
-    def __init__(self, obj):
-        super().__init__(obj)
-        self.obj = obj
-
-    def __str__(self):
-        msg = f'Invalid KVM Interface property vlan_bridge {self.obj} '
-        msg += 'The "vlan_bridge" value must be of format `br1234`.'
-        return msg
+def _mk(name, template):
+    """
+    Creates a validation exception class called `name` holding the offending object in `obj`, whose message is
+    `template` formatted with `obj`.
+    """
+    def __init__(self, obj):
+        Exception.__init__(self, obj)
+        self.obj = obj
+
+    def __str__(self):
+        return template.format(obj=self.obj)
+
+    return type(name, (Exception,), {
+        '__init__': __init__,
+        '__module__': __name__,
+        '__slots__': ('obj',),
+        '__str__': __str__,
+    })
+
+
+InvalidFirewallRuleAction = _mk(
+    'InvalidFirewallRuleAction',
+    'Invalid firewall rule action, Value: {obj}',
+)
+InvalidFirewallRuleDestination = _mk(
+    'InvalidFirewallRuleDestination',
+    'Invalid firewall rule destination, Value: {obj}',
+)
+InvalidFirewallRuleDestinationType = _mk(
+    'InvalidFirewallRuleDestinationType',
+    'Invalid firewall rule destination type, Value: {obj} is not a list',
+)
+InvalidFirewallRuleDestinationEmpty = _mk(
+    'InvalidFirewallRuleDestinationEmpty',
+    'Invalid firewall rule destination, it cannot be empty list: {obj}',
+)
+InvalidFirewallRuleIPAddress = _mk(
+    'InvalidFirewallRuleIPAddress',
+    'Invalid firewall rule IP address, Value: {obj} is not a valid CIDR IP',
+)
+InvalidFirewallRulePort = _mk(
+    'InvalidFirewallRulePort',
+    'Invalid firewall rule port, Value: {obj}',
+)
+InvalidFirewallRuleProtocol = _mk(
+    'InvalidFirewallRuleProtocol',
+    'Invalid firewall rule protocol, Value: {obj}',
+)
+InvalidFirewallRuleSingular = _mk(
+    'InvalidFirewallRuleSingular',
+    'Invalid firewall rule, Value: {obj}, When `any` or `@` is used Only one item is allowed per list',
+)
+InvalidFirewallRuleSource = _mk(
+    'InvalidFirewallRuleSource',
+    'Invalid firewall rule source, Value: {obj}',
+)
+InvalidFirewallRuleSourceType = _mk(
+    'InvalidFirewallRuleSourceType',
+    'Invalid firewall rule source type, Value: {obj} is not a list',
+)
+InvalidFirewallRuleSourceEmpty = _mk(
+    'InvalidFirewallRuleSourceEmpty',
+    'Invalid firewall rule source, it cannot be empty list: {obj}',
+)
+InvalidFirewallRuleItem = _mk(
+    'InvalidFirewallRuleItem',
+    'Invalid firewall rule, field: {obj} is missing in the rule object',
+)
+InvalidFirewallRuleType = _mk(
+    'InvalidFirewallRuleType',
+    'Invalid firewall rule type, Value: {obj}',
+)
+InvalidFirewallRuleVersion = _mk(
+    'InvalidFirewallRuleVersion',
+    'Invalid firewall rule version, Value: {obj}',
+)
+InvalidKVMInterfaceItem = _mk(
+    'InvalidKVMInterfaceItem',
+    'Invalid KVM Interface, field: {obj} is missing in the Interface object',
+)
+InvalidKVMInterfaceMacAddress = _mk(
+    'InvalidKVMInterfaceMacAddress',
+    'Invalid KVM Interface property mac_address: {obj}, The property is not a valid Mac Address',
+)
+InvalidKVMInterfaceVlanBridge = _mk(
+    'InvalidKVMInterfaceVlanBridge',
+    'Invalid KVM Interface property vlan_bridge {obj} The "vlan_bridge" value must be of format `br1234`.',
+)
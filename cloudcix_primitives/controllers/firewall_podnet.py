@@ -1,25 +1,46 @@
-# stdlib
-import ipaddress
 # local
 from cloudcix_primitives.controllers.exceptions import (
-    exception_handler,
     InvalidFirewallRuleAction,
-    InvalidFirewallRuleDestination,
+    InvalidFirewallRuleDestinationEmpty,
+    InvalidFirewallRuleDestinationType,
     InvalidFirewallRuleIPAddress,
+    InvalidFirewallRuleItem,
     InvalidFirewallRulePort,
     InvalidFirewallRuleProtocol,
-    InvalidFirewallRuleSource,
+    InvalidFirewallRuleSingular,
+    InvalidFirewallRuleSourceEmpty,
+    InvalidFirewallRuleSourceType,
     InvalidFirewallRuleType,
     InvalidFirewallRuleVersion,
 )
+from cloudcix_primitives.controllers.validators import is_valid_ip_network
 
-PORT_RANGE = range(1, 65536)
-PROTOCOL_CHOICES = ['any', 'tcp', 'udp', 'icmp', 'dns', 'vpn']
+PORT_MIN = 1
+PORT_MAX = 65535
+PROTOCOL_CHOICES = frozenset(('any', 'tcp', 'udp', 'icmp', 'dns', 'vpn'))
+ACTION_CHOICES = frozenset(('accept', 'drop'))
+VERSION_CHOICES = frozenset((4, 6))
+# every rule must carry these keys, even if only with a None value
+REQUIRED_FIELDS = ('source', 'destination', 'port', 'iiface', 'oiface', 'version', 'action', 'protocol')
 
 __all__ = ['FirewallPodNet']
 
 
 class FirewallPodNet:
+    __slots__ = (
+        'rule',
+        'success',
+        'errors',
+        '_action',
+        '_destination',
+        '_iiface',
+        '_oiface',
+        '_port',
+        '_protocol',
+        '_source',
+        '_version',
+    )
+
     rule: dict
     success: bool
     errors: list
@@ -30,103 +51,120 @@ class FirewallPodNet:
         self.errors = []
 
     def __call__(self):
-        validators = [
-            self._validate_action,
-            self._validate_version,
-            self._validate_destination,
-            self._validate_source,
-            self._validate_protocol,
-            self._validate_port,
-            self._validate_type,
-        ]
-
-        for validator in validators:
-            error = validator()
+        rule = self.rule
+        # a missing key is an error, unlike an explicit None, and leaves nothing sensible to validate
+        for field in REQUIRED_FIELDS:
+            if field not in rule:
+                self.success = False
+                self.errors.append(str(InvalidFirewallRuleItem(field)))
+        if not self.success:
+            return self.success, self.errors
+
+        # look each field up once rather than once per validator that needs it
+        self._action = rule['action']
+        self._destination = rule['destination']
+        self._iiface = rule['iiface']
+        self._oiface = rule['oiface']
+        self._port = rule['port']
+        self._protocol = rule['protocol']
+        self._source = rule['source']
+        self._version = rule['version']
+
+        for error in (
+            self._validate_action(),
+            self._validate_version(),
+            self._validate_destination(),
+            self._validate_source(),
+            self._validate_protocol(),
+            self._validate_port(),
+            self._validate_type(),
+        ):
             if error is not None:
                 self.success = False
-                self.errors.append(str(error))
+                self.errors.append(error)
 
         return self.success, self.errors
 
-    @exception_handler
-    def _validate_destination(self):
-        if self.rule['destination'] is None:
+    def _validate_addr_list(self, addresses, type_exc, empty_exc):
+        if addresses is None:
             return None
-        # check the `destination` type
-        if type(self.rule['destination']) is not list:
-            raise InvalidFirewallRuleDestination
-        #  catch invalid entries for `destination`
-        for ip in self.rule['destination']:
-            if ip != 'any':
-                try:
-                    ipaddress.ip_network(ip)
-                except (TypeError, ValueError):
-                    raise InvalidFirewallRuleIPAddress
+        # check the address list type
+        if not isinstance(addresses, list):
+            return str(type_exc(addresses))
+        if not addresses:
+            return str(empty_exc(addresses))
+        # `any` is only valid as the sole entry
+        if len(addresses) == 1 and addresses[0] == 'any':
+            return None
+        # catch invalid entries in the address list
+        for ip in addresses:
+            if ip == 'any':
+                return str(InvalidFirewallRuleSingular(addresses))
+            if not is_valid_ip_network(ip):
+                return str(InvalidFirewallRuleIPAddress(ip))
         return None
 
-    @exception_handler
+    def _validate_destination(self):
+        return self._validate_addr_list(
+            self._destination,
+            InvalidFirewallRuleDestinationType,
+            InvalidFirewallRuleDestinationEmpty,
+        )
+
     def _validate_source(self):
-        if self.rule['source'] is None:
-            return None
-        # check the `source` type
-        if type(self.rule['source']) is not list:
-            raise InvalidFirewallRuleSource
-        # catch invalid entries for `source`
-        for ip in self.rule['source']:
-            if ip != 'any':
-                try:
-                    ipaddress.ip_network(ip)
-                except (TypeError, ValueError):
-                    raise InvalidFirewallRuleIPAddress
-        return None
+        return self._validate_addr_list(
+            self._source,
+            InvalidFirewallRuleSourceType,
+            InvalidFirewallRuleSourceEmpty,
+        )
 
-    @exception_handler
     def _validate_protocol(self):
-        if self.rule['protocol'] not in PROTOCOL_CHOICES:
-            raise InvalidFirewallRuleProtocol
+        # check the type first, an unhashable value cannot be looked up in the frozenset
+        if not isinstance(self._protocol, str) or self._protocol not in PROTOCOL_CHOICES:
+            return str(InvalidFirewallRuleProtocol(self._protocol))
         return None
 
-    @exception_handler
     def _validate_port(self):
-        if self.rule['port'] is None:
+        ports = self._port
+        if ports is None:
             return None
         # check the `port` type
-        if type(self.rule['port']) is not list:
-            raise InvalidFirewallRulePort
-        # catch invalid entries for `port`
-        for prt in self.rule['port']:
-            try:
-                if '-' in prt:
-                    items = prt.split('-')
-                    if len(items) >= 3:
-                        return InvalidFirewallRulePort
-                    for item in items:
-                        if int(item) not in PORT_RANGE:
-                            return InvalidFirewallRulePort
-                else:
-                    if int(prt) not in PORT_RANGE:
-                        return InvalidFirewallRulePort
-            except (TypeError, ValueError):
-                return InvalidFirewallRulePort
+        if not isinstance(ports, list) or not ports:
+            return str(InvalidFirewallRulePort(ports))
+        # catch invalid entries for `port`, each one a string holding a port number or a `low-high` range
+        for prt in ports:
+            if not isinstance(prt, str):
+                return str(InvalidFirewallRulePort(prt))
+            # fast path for the common case of a single numeric port
+            if prt.isdecimal():
+                if not PORT_MIN <= int(prt) <= PORT_MAX:
+                    return str(InvalidFirewallRulePort(prt))
+                continue
+            parts = prt.split('-')
+            if len(parts) != 2:
+                return str(InvalidFirewallRulePort(prt))
+            low, high = parts
+            if not (low.isdecimal() and high.isdecimal()):
+                return str(InvalidFirewallRulePort(prt))
+            if not (PORT_MIN <= int(low) <= PORT_MAX and PORT_MIN <= int(high) <= PORT_MAX):
+                return str(InvalidFirewallRulePort(prt))
         return None
 
-    @exception_handler
     def _validate_version(self):
         try:
-            if int(self.rule['version']) not in [4, 6]:
-                raise InvalidFirewallRuleVersion
+            version = int(self._version)
         except (TypeError, ValueError):
-            return InvalidFirewallRuleVersion
+            version = None
+        if version not in VERSION_CHOICES:
+            return str(InvalidFirewallRuleVersion(self._version))
         return None
 
-    @exception_handler
     def _validate_action(self):
-        if self.rule['action'] not in ['accept', 'drop']:
-            raise InvalidFirewallRuleAction
+        if not isinstance(self._action, str) or self._action not in ACTION_CHOICES:
+            return str(InvalidFirewallRuleAction(self._action))
         return None
 
-    @exception_handler
     def _validate_type(self):
-        if self.rule['iiface'] in [None, '', 'none'] and self.rule['oiface'] in [None, '', 'none']:
-            raise InvalidFirewallRuleType
+        if self._iiface in [None, '', 'none'] and self._oiface in [None, '', 'none']:
+            return str(InvalidFirewallRuleType((self._iiface, self._oiface)))
         return None
@@ -0,0 +1,76 @@
+# stdlib
+import ipaddress
+import re
+from functools import lru_cache
+
+
+__all__ = [
+    'is_valid_mac',
+    'is_valid_vlan_bridge',
+    'is_valid_ip_network',
+    'ip_network',
+    'HEX_DIGITS',
+    'IPV4_NETWORK_RE',
+    'IPV6_NETWORK_RE',
+]
+
+
+# Coarse syntax checks for IPv4/IPv6 addresses with an optional prefix length, cheap to run before ip_network()
+IPV4_NETWORK_RE = re.compile(r'^\d{1,3}(\.\d{1,3}){3}(/\d{1,2})?$')
+IPV6_NETWORK_RE = re.compile(r'^[0-9A-Fa-f:.]+(/\d{1,3})?$')
+
+HEX_DIGITS = frozenset('0123456789abcdefABCDEF')
+
+
+def is_valid_mac(mac_address):
+    # A MAC address has a fixed shape, six hex pairs separated by either `:` or `-`, e.g. aa:bb:cc:dd:ee:ff,
+    # so check it character by character instead of running a regex
+    if not isinstance(mac_address, str) or len(mac_address) != 17:
+        return False
+    separator = mac_address[2]
+    if separator not in (':', '-'):
+        return False
+    for i in (5, 8, 11, 14):
+        if mac_address[i] != separator:
+            return False
+    for i in (0, 1, 3, 4, 6, 7, 9, 10, 12, 13, 15, 16):
+        if mac_address[i] not in HEX_DIGITS:
+            return False
+    return True
+
+
+def is_valid_vlan_bridge(vlan_bridge):
+    # A VLAN bridge is always `br` followed by four ASCII digits, e.g. br1234, so no regex is needed
+    return (
+        isinstance(vlan_bridge, str)
+        and len(vlan_bridge) == 6
+        and vlan_bridge.startswith('br')
+        and vlan_bridge[2:].isascii()
+        and vlan_bridge[2:].isdigit()
+    )
+
+
+@lru_cache(maxsize=4096)
+def ip_network(address):
+    """
+    Memoized ipaddress.ip_network(). Firewall rules commonly repeat the same addresses, so repeated
+    validations are served from the cache. Invalid addresses raise ValueError (TypeError for unhashable
+    input) just like ipaddress.ip_network() and are not cached.
+    """
+    return ipaddress.ip_network(address)
+
+
+def is_valid_ip_network(address):
+    """
+    Checks if address is a valid IPv4/IPv6 network in CIDR notation. Strings that cannot be an address are
+    rejected by a regex before paying for a full ip_network() parse.
+    """
+    if not isinstance(address, str):
+        return False
+    if IPV4_NETWORK_RE.match(address) is None and IPV6_NETWORK_RE.match(address) is None:
+        return False
+    try:
+        ip_network(address)
+    except ValueError:
+        return False
+    return True
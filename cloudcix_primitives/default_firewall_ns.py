@@ -1,10 +1,17 @@
 # stdlib
-import json
+import hashlib
+import os
+import shutil
+import subprocess
 from typing import Tuple
-# lib
-from cloudcix.rcc import CHANNEL_SUCCESS, comms_ssh, CONNECTION_ERROR, VALIDATION_ERROR
 # local
-from cloudcix_primitives.utils import load_pod_config, PodnetErrorFormatter, SSHCommsWrapper
+from cloudcix_primitives.utils import (
+    get_ssh_session,
+    PodnetErrorFormatter,
+    run_podnets,
+    run_steps,
+    with_pod_config,
+)
 
 
 __all__ = [
@@ -15,10 +22,207 @@ __all__ = [
 
 SUCCESS_CODE = 0
 
+# File in the name space's /etc/netns directory recording the hash of the last ruleset script build() applied and
+# the hash of `nft list ruleset` right after applying it, formatted with the name space as {namespace}
+FINGERPRINT_FILE = '/etc/netns/{namespace}/default_firewall.sha256'
+
+# If set, build() dry runs the ruleset script with the controller's own `nft --check` before changing anything on
+# the PodNets. This checks against the controller's nft rather than the PodNets', and nft needs to be installed
+# and permitted to talk to the kernel, so the check is off by default and any failure to run it fails the build.
+NFT_CHECK_ENV = 'CLOUDCIX_NFT_CHECK'
+
+# (payload name, message offset) in the order the payloads run. A payload's channel error message is
+# prefix + offset, its payload error message prefix + offset + 1.
+BUILD_STEPS = (
+    ('apply_ruleset', 1),
+)
+SCRUB_STEPS = (
+    ('flush_ruleset', 1),
+)
+
+# Error messages indexed by error code. Only the success message (1000) mentions the namespace and is formatted on
+# return.
+BUILD_MESSAGES = {
+    3021: 'Failed to connect to the enabled PodNet for apply_ruleset payload: ',
+    3022: 'Failed to run apply_ruleset payload on the enabled PodNet. Payload exited with status ',
+
+    3061: 'Failed to connect to the disabled PodNet for apply_ruleset payload: ',
+    3062: 'Failed to run apply_ruleset payload on the disabled PodNet. Payload exited with status ',
+}
+SCRUB_MESSAGES = {
+    3121: 'Failed to connect to the enabled PodNet for flush_ruleset payload: ',
+    3122: 'Failed to run flush_ruleset payload on the enabled PodNet. Payload exited with status ',
+
+    3161: 'Failed to connect to the disabled PodNet for flush_ruleset payload: ',
+    3162: 'Failed to run flush_ruleset payload on the disabled PodNet. Payload exited with status ',
+}
+
+PAYLOAD_CHANNELS = {'payload_message': 'STDOUT', 'payload_error': 'STDERR'}
+
+INTERFACE_SETS = (
+    'PRIVATE',
+    'S2S_TUNNEL',
+    'DYN_TUNNEL',
+)
+
+USER_CHAINS = (
+    'GEO_IN_ALLOW',
+    'GEO_IN_BLOCK',
+    'GEO_OUT_ALLOW',
+    'GEO_OUT_BLOCK',
+    'PROJECT_OUT',
+    'PROJECT_IN',
+    'VPNS2S',
+    'VPNDYN',
+    'PRVT_2_PRVT',
+)
+
+RULES = (
+    # INPUT
+    'add rule inet FILTER INPUT '
+    'ct state established,related accept',
+
+    'add rule inet FILTER INPUT '
+    'icmp type { echo-reply, destination-unreachable, echo-request, time-exceeded } accept',
+
+    'add rule inet FILTER INPUT '
+    'icmpv6 type { echo-request, mld-listener-query, nd-router-solicit, nd-router-advert, nd-neighbor-solicit, nd-neighbor-advert } accept',
+
+    # DNS and IKE/NAT-T in one hashed lookup instead of a rule each
+    'add rule inet FILTER INPUT '
+    'meta l4proto . th dport vmap { tcp . 53 : accept, udp . 53 : accept, udp . 500 : accept, udp . 4500 : accept }',
+
+    'add rule inet FILTER INPUT '
+    'ip protocol esp accept',
+
+    # PREROUTING
+    'add rule inet FILTER PREROUTING '
+    'ct state established,related accept',
+
+    'add rule inet FILTER PREROUTING '
+    'iifname %(namespace)s.%(public_bridge)s jump GEO_IN_ALLOW',
+
+    'add rule inet FILTER PREROUTING '
+    'iifname %(namespace)s.%(public_bridge)s jump GEO_IN_BLOCK',
+
+    # POSTROUTING
+    'add rule inet FILTER POSTROUTING '
+    'ct state established,related accept',
+
+    'add rule inet FILTER POSTROUTING '
+    'oifname %(namespace)s.%(public_bridge)s jump GEO_OUT_ALLOW',
+
+    'add rule inet FILTER POSTROUTING '
+    'oifname %(namespace)s.%(public_bridge)s jump GEO_OUT_BLOCK',
+
+    # FORWARD
+    'add rule inet FILTER FORWARD '
+    'ct state established,related accept',
+
+    'add rule inet FILTER FORWARD '
+    'iifname @PRIVATE oifname %(namespace)s.%(public_bridge)s jump PROJECT_OUT',
+
+    'add rule inet FILTER FORWARD '
+    'iifname %(namespace)s.%(public_bridge)s oifname @PRIVATE jump PROJECT_IN',
+
+    'add rule inet FILTER FORWARD '
+    'iifname @PRIVATE oifname @S2S_TUNNEL jump VPNS2S',
+
+    'add rule inet FILTER FORWARD '
+    'iifname @S2S_TUNNEL oifname @PRIVATE jump VPNS2S',
+
+    'add rule inet FILTER FORWARD '
+    'iifname @PRIVATE oifname @DYN_TUNNEL jump VPNDYN',
+
+    'add rule inet FILTER FORWARD '
+    'iifname @DYN_TUNNEL oifname @PRIVATE jump VPNDYN',
+
+    'add rule inet FILTER FORWARD '
+    'iifname @PRIVATE oifname @PRIVATE jump PRVT_2_PRVT',
+)
+
+# The whole default ruleset as one nft script, applied atomically in a single round trip and nft process.
+# build() fills in %(namespace)s and %(public_bridge)s.
+RULESET_TEMPLATE = "\n".join([
+    'flush ruleset',
+
+    'add table ip NAT',
+    'add table inet FILTER',
+
+    'add chain ip NAT POSTROUTING { type nat hook postrouting priority 100 ; policy accept ; }',
+    'add chain ip NAT PREROUTING { type nat hook prerouting priority -100 ; policy accept ; }',
+
+    'add chain inet FILTER POSTROUTING { type filter hook postrouting priority 0 ; policy accept ; }',
+    'add chain inet FILTER PREROUTING { type filter hook prerouting priority 0 ; policy accept ; }',
+    'add chain inet FILTER OUTPUT { type filter hook output priority 0 ; policy accept ; }',
+    'add chain inet FILTER INPUT { type filter hook input priority 0 ; policy drop ; }',
+    'add chain inet FILTER FORWARD { type filter hook forward priority 0 ; policy drop ; }',
+
+    *(f'add set inet FILTER {set_name} {{ type ifname ; }}' for set_name in INTERFACE_SETS),
+    *(f'add chain inet FILTER {chain}' for chain in USER_CHAINS),
+    *RULES,
+])
+
+
+def _check_ruleset(script):
+    """
+    Dry runs script with the local `nft --check`, see NFT_CHECK_ENV.
+    :return: None if nft accepted the script, otherwise nft's error output or the reason it could not be run
+    """
+    nft = shutil.which('nft')
+    if nft is None:
+        return 'nft is not installed on this host'
+    try:
+        result = subprocess.run(
+            [nft, '--check', '-f', '-'],
+            input=script,
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return f'Could not run nft: {e}'
+    if result.returncode != 0:
+        return result.stderr
+    return None
+
+
+def _formatter(config_file, podnet_node, enabled, successful_payloads):
+    """
+    Returns a new PodnetErrorFormatter for a run_podnet() on podnet_node.
+    """
+    return PodnetErrorFormatter(config_file, podnet_node, enabled, PAYLOAD_CHANNELS, successful_payloads)
+
+
+def _rcc(podnet_node, rcc_factory):
+    """
+    Returns the object to run podnet_node's payloads with, rcc_factory(podnet_node) if a factory was passed and
+    the node's shared persistent SSH session otherwise.
+    """
+    if rcc_factory is None:
+        return get_ssh_session(podnet_node, 'robot')
+    return rcc_factory(podnet_node)
+
+
+def _results(results):
+    """
+    Returns the status and message of the first failed run_podnets() result, the enabled node's if both failed.
+    """
+    for status, msg, _ in results:
+        if status is False:
+            return status, msg
+    return True, ''
+
+
+@with_pod_config
 def build(
         namespace: str,
         public_bridge: str,
         config_file=None,
+        *,
+        rcc_factory=None,
+        enabled: str,
+        disabled: str,
 ) -> Tuple[bool, str]:
     """
     description:
@@ -41,6 +245,14 @@ def build(
             description: path to the config.json file
             type: string
             required: false
+        rcc_factory:
+            description: |
+                callable taking a PodNet node's address and returning the object to run that node's payloads
+                with, anything with a run(payload) method returning an RCC response dict. Lets callers that
+                run several primitives in a row share their own connections. Defaults to the node's shared
+                persistent SSH session.
+            type: callable
+            required: false
     return:
         description: |
             A tuple with a boolean flag stating if the build was successful or not and
@@ -48,325 +260,66 @@ def build(
         type: tuple
     """
 
-    messages = {
-    1000: f'1000: Successfully created default firewall in project name space {namespace} on both PodNet nodes.',
-
-    3021: f'Failed to connect to the enabled PodNet for flush_ruleset payload: ',
-    3022: f'Failed to run flush_ruleset payload on the enabled PodNet. Payload exited with status ',
-    3023: f'Failed to connect to the enabled PodNet for create_nat_table payload: ',
-    3024: f'Failed to run create_nat_table payload on the enabled PodNet. Payload exited with status ',
-    3025: f'Failed to connect to the enabled PodNet for create_filter_table payload: ',
-    3026: f'Failed to run create_filter_table payload on the enabled PodNet. Payload exited with status ',
-    3027: f'Failed to connect to the enabled PodNet for create_nat_postrouting_chain payload: ',
-    3028: f'Failed to run create_nat_postrouting_chain payload on the enabled PodNet. Payload exited with status ',
-    3029: f'Failed to connect to the enabled PodNet for create_nat_prerouting_chain payload: ',
-    3030: f'Failed to run create_nat_prerouting_chain payload on the enabled PodNet. Payload exited with status ',
-    3031: f'Failed to connect to the enabled PodNet for create_filter_postrouting_chain payload: ',
-    3032: f'Failed to run create_filter_postrouting_chain payload on the enabled PodNet. Payload exited with status ',
-    3033: f'Failed to connect to the enabled PodNet for create_filter_prerouting_chain payload: ',
-    3034: f'Failed to run create_filter_prerouting_chain payload on the enabled PodNet. Payload exited with status ',
-    3035: f'Failed to connect to the enabled PodNet for create_filter_output_chain payload: ',
-    3036: f'Failed to run create_filter_output_chain payload on the enabled PodNet. Payload exited with status ',
-    3037: f'Failed to connect to the enabled PodNet for create_filter_input_chain payload: ',
-    3038: f'Failed to run create_filter_input_chain payload on the enabled PodNet. Payload exited with status ',
-    3039: f'Failed to connect to the enabled PodNet for create_filter_forward_chain payload: ',
-    3040: f'Failed to run create_filter_forward_chain payload on the enabled PodNet. Payload exited with status ',
-    3041: f'Failed to connect to the enabled PodNet for create_interface_set %(set_name)s payload (%(payload)s): ',
-    3042: f'Failed to run create_interface_set %(set_name)s payload (%(payload)s) on the enabled PodNet. Payload exited with status ',
-    3043: f'Failed to connect to the enabled PodNet for create_user_chain %(chain)s payload (%(payload)s): ',
-    3044: f'Failed to run create_user_chain %(chain)s payload (%(payload)s) on the enabled PodNet. Payload exited with status ',
-    3045: f'Failed to connect to the enabled PodNet for create_rule payload (%(payload)s): ',
-    3046: f'Failed to run create_rule payload (%(payload)s) on the enabled PodNet. Payload exited with status ',
-
-    3061: f'Failed to connect to the disabled PodNet for flush_ruleset payload: ',
-    3062: f'Failed to run flush_ruleset payload on the disabled PodNet. Payload exited with status ',
-    3063: f'Failed to connect to the disabled PodNet for create_nat_table payload: ',
-    3064: f'Failed to run create_nat_table payload on the disabled PodNet. Payload exited with status ',
-    3065: f'Failed to connect to the disabled PodNet for create_filter_table payload: ',
-    3066: f'Failed to run create_filter_table payload on the disabled PodNet. Payload exited with status ',
-    3067: f'Failed to connect to the disabled PodNet for create_nat_postrouting_chain payload: ',
-    3068: f'Failed to run create_nat_postrouting_chain payload on the disabled PodNet. Payload exited with status ',
-    3069: f'Failed to connect to the disabled PodNet for create_nat_prerouting_chain payload: ',
-    3070: f'Failed to run create_nat_prerouting_chain payload on the disabled PodNet. Payload exited with status ',
-    3071: f'Failed to connect to the disabled PodNet for create_filter_postrouting_chain payload: ',
-    3072: f'Failed to run create_filter_postrouting_chain payload on the disabled PodNet. Payload exited with status ',
-    3073: f'Failed to connect to the disabled PodNet for create_filter_prerouting_chain payload: ',
-    3074: f'Failed to run create_filter_prerouting_chain payload on the disabled PodNet. Payload exited with status ',
-    3075: f'Failed to connect to the disabled PodNet for create_filter_output_chain payload: ',
-    3076: f'Failed to run create_filter_output_chain payload on the disabled PodNet. Payload exited with status ',
-    3077: f'Failed to connect to the disabled PodNet for create_filter_input_chain payload: ',
-    3078: f'Failed to run create_filter_input_chain payload on the disabled PodNet. Payload exited with status ',
-    3079: f'Failed to connect to the disabled PodNet for create_filter_forward_chain payload: ',
-    3080: f'Failed to run create_filter_forward_chain payload on the disabled PodNet. Payload exited with status ',
-    3081: f'Failed to connect to the disabled PodNet for create_interface_set payload (%(payload)s): ',
-    3082: f'Failed to run create_interface_set payload (%(payload)s) on the disabled PodNet. Payload exited with status ',
-    3083: f'Failed to connect to the disabled PodNet for create_user_chain payload (%(payload)s): ',
-    3084: f'Failed to run create_user_chain payload (%(payload)s) on the disabled PodNet. Payload exited with status ',
-    3085: f'Failed to connect to the disabled PodNet for create_rule payload (%(payload)s): ',
-    3086: f'Failed to run create_rule payload (%(payload)s) on the disabled PodNet. Payload exited with status ',
+    messages = BUILD_MESSAGES
+
+    # The script is identical for both PodNet nodes, so it is rendered and hashed once
+    script = RULESET_TEMPLATE % {'namespace': namespace, 'public_bridge': public_bridge}
+    script_hash = hashlib.sha256(script.encode()).hexdigest()
+
+    if os.environ.get(NFT_CHECK_ENV):
+        check_error = _check_ruleset(script)
+        if check_error is not None:
+            return False, f'3001: Failed to validate the default ruleset locally with nft --check:\n{check_error}'
+
+    fingerprint_file = FINGERPRINT_FILE.format(namespace=namespace)
+    live_hash = f"ip netns exec {namespace} nft list ruleset | sha256sum | cut -d ' ' -f 1"
+
+    # The fingerprint check runs on the PodNet in the same payload as the apply, so an unchanged ruleset costs
+    # one round trip and a changed one no more than that. nft is skipped if this exact script was applied last
+    # and the ruleset has not been touched since. Recording the fingerprint is best effort, failing to write it only
+    # means the next build() applies the ruleset again.
+    payloads = {
+        'apply_ruleset': "\n".join([
+            f'[ "$(cat {fingerprint_file} 2>/dev/null)" = "{script_hash} $({live_hash})" ] || '
+            f"{{ ip netns exec {namespace} nft -f - <<'EOF' && "
+            f'{{ echo "{script_hash} $({live_hash})" 2>/dev/null > {fingerprint_file} || true; }}; }}',
+            script,
+            "EOF"
+        ]),
     }
 
-    # Default config_file if it is None
-    if config_file is None:
-        config_file = '/opt/robot/config.json'
-
-
-    status, config_data, msg = load_pod_config(config_file)
-    if not status:
-      if config_data['raw'] is None:
-          return False, msg
-      else:
-          return False, msg + "\nJSON dump of raw configuration:\n" + json.dumps(config_data['raw'],
-              indent=2,
-              sort_keys=True)
-    enabled = config_data['processed']['enabled']
-    disabled = config_data['processed']['disabled']
-
     def run_podnet(podnet_node, prefix, successful_payloads):
-        rcc = SSHCommsWrapper(comms_ssh, podnet_node, 'robot')
-        fmt = PodnetErrorFormatter(
-            config_file,
-            podnet_node,
-            podnet_node == enabled,
-            {'payload_message': 'STDOUT', 'payload_error': 'STDERR'},
-            successful_payloads
-        )
-
-        interface_sets = ['PRIVATE',
-                          'S2S_TUNNEL',
-                          'DYN_TUNNEL']
-
-        user_chains = ['GEO_IN_ALLOW',
-                       'GEO_IN_BLOCK',
-                       'GEO_OUT_ALLOW',
-                       'GEO_OUT_BLOCK',
-                       'PROJECT_OUT',
-                       'PROJECT_IN',
-                       'VPNS2S',
-                       'VPNDYN',
-                       'PRVT_2_PRVT']
-
-        rules = [
-            # INPUT
-            f'ip netns exec {namespace} nft add rule inet FILTER INPUT '
-            f'ct state established,related accept',
-
-            f'ip netns exec {namespace} nft add rule inet FILTER INPUT '
-            'icmp type { echo-reply, destination-unreachable, echo-request, time-exceeded } accept',
-
-            f'ip netns exec {namespace} nft add rule inet FILTER INPUT '
-            'icmpv6 type { echo-request, mld-listener-query, nd-router-solicit, nd-router-advert, nd-neighbor-solicit, nd-neighbor-advert } accept',
-
-            f'ip netns exec {namespace} nft add rule inet FILTER INPUT '
-            'meta l4proto { tcp, udp } th dport 53 accept',
-
-            f'ip netns exec {namespace} nft add rule inet FILTER INPUT '
-            'udp dport {500, 4500} accept',
-
-            f'ip netns exec {namespace} nft add rule inet FILTER INPUT '
-            'ip protocol esp accept',
-
-            # PREROUTING
-            f'ip netns exec {namespace} nft add rule inet FILTER PREROUTING '
-            'ct state established,related accept',
-
-            f'ip netns exec {namespace} nft add rule inet FILTER PREROUTING '
-            f'iifname {namespace}.{public_bridge} jump GEO_IN_ALLOW',
-
-            f'ip netns exec ns1100 nft add rule inet FILTER PREROUTING '
-            f'iifname {namespace}.{public_bridge} jump GEO_IN_BLOCK',
-
-
-            # POSTROUTING
-            f'ip netns exec {namespace} nft add rule inet FILTER POSTROUTING '
-            'ct state established,related accept',
-
-            f'ip netns exec {namespace} nft add rule inet FILTER POSTROUTING '
-            f'oifname {namespace}.{public_bridge} jump GEO_OUT_ALLOW',
-
-            f'ip netns exec {namespace} nft add rule inet FILTER POSTROUTING '
-            f'oifname {namespace}.{public_bridge} jump GEO_OUT_BLOCK',
-
-            # FORWARD
-            f'ip netns exec ns1100 nft add rule inet FILTER FORWARD '
-            'ct state established,related accept',
-
-            f'ip netns exec ns1100 nft add rule inet FILTER FORWARD '
-            'iifname @PRIVATE oifname ns1100.br-B1 jump PROJECT_OUT',
-
-            f'ip netns exec ns1100 nft add rule inet FILTER FORWARD '
-            'iifname ns1100.br-B1 oifname @PRIVATE jump PROJECT_IN',
-
-            f'ip netns exec ns1100 nft add rule inet FILTER FORWARD '
-            'iifname @PRIVATE oifname @S2S_TUNNEL jump VPNS2S',
-
-            f'ip netns exec ns1100 nft add rule inet FILTER FORWARD '
-            'iifname @S2S_TUNNEL oifname @PRIVATE jump VPNS2S',
-
-            f'ip netns exec ns1100 nft add rule inet FILTER FORWARD '
-            'iifname @PRIVATE oifname @DYN_TUNNEL jump VPNDYN',
-
-            f'ip netns exec ns1100 nft add rule inet FILTER FORWARD '
-            'iifname @DYN_TUNNEL oifname @PRIVATE jump VPNDYN',
-
-            f'ip netns exec ns1100 nft add rule inet FILTER FORWARD '
-            'iifname @PRIVATE oifname @PRIVATE jump PRVT_2_PRVT',
-
-        ]
-
-        payloads = {
-            'flush_ruleset': f'ip netns exec {namespace} nft flush ruleset',
-
-            'create_nat_table': f'ip netns exec {namespace} '
-                                'nft add table ip NAT',
-            'create_filter_table': f'ip netns exec {namespace} '
-                                   'nft add table inet FILTER',
-
-            'create_nat_postrouting_chain': f'ip netns exec {namespace} '
-                                            'nft add chain ip NAT POSTROUTING '
-                                            '{ type nat hook postrouting priority 100 \\; policy accept \\; }',
-            'create_nat_prerouting_chain': f'ip netns exec {namespace} '
-                                           'nft add chain ip NAT PREROUTING '
-                                           '{ type nat hook prerouting priority -100 \\; policy accept \\; }',
-
-            'create_filter_postrouting_chain': f'ip netns exec {namespace} nft add chain inet '
-                                              'FILTER POSTROUTING '
-                                              '{ type filter hook postrouting priority 0 \\; policy accept \\; }',
-            'create_filter_prerouting_chain': f'ip netns exec {namespace} nft add chain inet '
-                                              'FILTER PREROUTING '
-                                              '{ type filter hook prerouting priority 0 \\; policy accept \\; }',
-            'create_filter_output_chain': f'ip netns exec {namespace} nft '
-                                          'add chain inet FILTER OUTPUT '
-                                          '{ type filter hook output priority 0 \\; policy accept \\; }',
-            'create_filter_input_chain': f'ip netns exec {namespace} '
-                                         'nft add chain inet FILTER INPUT '
-                                         '{ type filter hook input priority 0 \\; policy drop \\; }',
-            'create_filter_forward_chain': f'ip netns exec {namespace} '
-                                           'nft add chain inet FILTER FORWARD '
-                                           '{ type filter hook forward priority 0 \\; policy drop \\; }',
-            'create_interface_set': f'ip netns exec {namespace} '
-                                       'nft add set inet FILTER %(set_name)s { type ifname\\; }',
-            'create_user_chain': f'ip netns exec {namespace} '
-                                 'nft add chain inet FILTER %(chain_name)s',
-        }
-
-        ret = rcc.run(payloads['flush_ruleset'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+1}: " + messages[prefix+1]), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f"{prefix+2}: " + messages[prefix+2]), fmt.successful_payloads
-        fmt.add_successful('flush_ruleset', ret)
-
-        ret = rcc.run(payloads['create_nat_table'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+3}: " + messages[prefix+3]), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f"{prefix+4}: " + messages[prefix+4]), fmt.successful_payloads
-        fmt.add_successful('create_nat_table', ret)
-
-        ret = rcc.run(payloads['create_filter_table'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+5}: " + messages[prefix+5]), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f"{prefix+6}: " + messages[prefix+6]), fmt.successful_payloads
-        fmt.add_successful('create_filter_table', ret)
-
-        ret = rcc.run(payloads['create_nat_postrouting_chain'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+7}: " + messages[prefix+7]), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f"{prefix+8}: " + messages[prefix+8]), fmt.successful_payloads
-        fmt.add_successful('create_nat_postrouting_chain', ret)
-
-        ret = rcc.run(payloads['create_nat_prerouting_chain'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+9}: " + messages[prefix+9]), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f"{prefix+10}: " + messages[prefix+10]), fmt.successful_payloads
-        fmt.add_successful('create_nat_prerouting_chain', ret)
-
-        ret = rcc.run(payloads['create_filter_postrouting_chain'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+11}: " + messages[prefix+11]), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f"{prefix+12}: " + messages[prefix+12]), fmt.successful_payloads
-        fmt.add_successful('create_filter_postrouting_chain', ret)
-
-        ret = rcc.run(payloads['create_filter_prerouting_chain'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+13}: " + messages[prefix+13]), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f"{prefix+14}: " + messages[prefix+14]), fmt.successful_payloads
-        fmt.add_successful('create_filter_prerouting_chain', ret)
-
-        ret = rcc.run(payloads['create_filter_output_chain'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+15}: " + messages[prefix+15]), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f"{prefix+16}: " + messages[prefix+16]), fmt.successful_payloads
-        fmt.add_successful('create_filter_output_chain', ret)
-
-        ret = rcc.run(payloads['create_filter_input_chain'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+17}: " + messages[prefix+17]), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f"{prefix+18}: " + messages[prefix+18]), fmt.successful_payloads
-        fmt.add_successful('create_filter_input_chain', ret)
-
-        ret = rcc.run(payloads['create_filter_forward_chain'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+19}: " + messages[prefix+19]), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f"{prefix+20}: " + messages[prefix+20]), fmt.successful_payloads
-        fmt.add_successful('create_filter_forward_chain', ret)
-
-        for set_name in interface_sets:
-            payload = payloads['create_interface_set'] % {'set_name': set_name}
-            ret = rcc.run(payload)
-            if ret["channel_code"] != CHANNEL_SUCCESS:
-                return False, fmt.channel_error(ret, f"{prefix+21}: " + messages[prefix+21] % {'payload': payload, 'set_name': set_name}), fmt.successful_payloads
-            if ret["payload_code"] != SUCCESS_CODE:
-                return False, fmt.payload_error(ret, f"{prefix+22}: " + messages[prefix+22] % {'payload': payload, 'set_name': set_name}), fmt.successful_payloads
-            fmt.add_successful('create_interface_set %s' % set_name, ret)
-
-        for chain in user_chains:
-            payload = payloads['create_user_chain'] % {'chain_name': chain}
-            ret = rcc.run(payload)
-            if ret["channel_code"] != CHANNEL_SUCCESS:
-                return False, fmt.channel_error(ret, f"{prefix+23}: " + messages[prefix+23] % {'payload': payload, 'chain': chain}), fmt.successful_payloads
-            if ret["payload_code"] != SUCCESS_CODE:
-                return False, fmt.payload_error(ret, f"{prefix+24}: " + messages[prefix+24] % {'payload': payload, 'chain': chain}), fmt.successful_payloads
-            fmt.add_successful('create_user_chain %s' % chain, ret)
-
-        for rule in rules:
-            ret = rcc.run(rule)
-            if ret["channel_code"] != CHANNEL_SUCCESS:
-                return False, fmt.channel_error(ret, f"{prefix+25}: " + messages[prefix+25] % {'payload': rule}), fmt.successful_payloads
-            if ret["payload_code"] != SUCCESS_CODE:
-                return False, fmt.payload_error(ret, f"{prefix+26}: " + messages[prefix+26] % {'payload': rule}), fmt.successful_payloads
-            fmt.add_successful('create_rule (%s)' % rule, ret)
-
-        return True, "", fmt.successful_payloads
-
-
-    status, msg, successful_payloads = run_podnet(enabled, 3020, {})
+        rcc = _rcc(podnet_node, rcc_factory)
+        fmt = _formatter(config_file, podnet_node, podnet_node == enabled, successful_payloads)
+
+        status, msg = run_steps(rcc, fmt, payloads, BUILD_STEPS, prefix, messages)
+        return status, msg, fmt.successful_payloads
+
+    # The nodes run concurrently, and only once if enabled and disabled are the same node
+    successful_payloads = {}
+    status, msg = _results(run_podnets(
+        run_podnet,
+        (enabled, 3020, successful_payloads),
+        (disabled, 3060, successful_payloads),
+    ))
     if status == False:
         return status, msg
 
-    status, msg, successful_payloads = run_podnet(disabled, 3060, successful_payloads)
-    if status == False:
-        return status, msg
-
-    return True, messages[1000]
+    return True, f'1000: Successfully created default firewall in project name space {namespace} on both PodNet nodes.'
 
 
 def read() -> Tuple[bool, dict, str]:
     return(False, {}, 'Not Implemented')
 
 
+@with_pod_config
 def scrub(
     namespace: str,
-    config_file=None
+    config_file=None,
+    *,
+    rcc_factory=None,
+    enabled: str,
+    disabled: str,
     ) -> Tuple[bool, str]:
     """
     description:
@@ -389,6 +342,14 @@ def scrub(
             description: path to the config.json file
             type: string
             required: false
+        rcc_factory:
+            description: |
+                callable taking a PodNet node's address and returning the object to run that node's payloads
+                with, anything with a run(payload) method returning an RCC response dict. Lets callers that
+                run several primitives in a row share their own connections. Defaults to the node's shared
+                persistent SSH session.
+            type: callable
+            required: false
     return:
         description: |
             A tuple with a boolean flag stating if the build was successful or not and
@@ -396,59 +357,27 @@ def scrub(
         type: tuple
     """
 
-    messages = {
-    1000: f'1000: Successfully scrubbed default firewall in project name space {namespace} on both PodNet nodes.',
+    messages = SCRUB_MESSAGES
 
-    3121: f'Failed to connect to the enabled PodNet for flush_ruleset payload: ',
-    3122: f'Failed to run flush_ruleset payload on the enabled PodNet. Payload exited with status ',
-    3161: f'Failed to connect to the disabled PodNet for flush_ruleset payload: ',
-    3162: f'Failed to run flush_ruleset payload on the disabled PodNet. Payload exited with status ',
+    payloads = {
+        'flush_ruleset': f'ip netns exec {namespace} nft flush ruleset && rm -f {FINGERPRINT_FILE.format(namespace=namespace)}'
     }
 
-    # Default config_file if it is None
-    if config_file is None:
-        config_file = '/opt/robot/config.json'
-
-    status, config_data, msg = load_pod_config(config_file)
-    if not status:
-      if config_data['raw'] is None:
-          return False, msg
-      else:
-          return False, msg + "\nJSON dump of raw configuration:\n" + json.dumps(config_data['raw'],
-              indent=2,
-              sort_keys=True)
-    enabled = config_data['processed']['enabled']
-    disabled = config_data['processed']['disabled']
-
     def run_podnet(podnet_node, prefix, successful_payloads):
-        rcc = SSHCommsWrapper(comms_ssh, podnet_node, 'robot')
-        fmt = PodnetErrorFormatter(
-            config_file,
-            podnet_node,
-            podnet_node == enabled,
-            {'payload_message': 'STDOUT', 'payload_error': 'STDERR'},
-            successful_payloads
-        )
-
-        payloads = {
-            'flush_ruleset': f'ip netns exec {namespace} nft flush ruleset'
-        }
-
-        ret = rcc.run(payloads['flush_ruleset'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+1}: " + messages[prefix+1]), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f"{prefix+2}: " + messages[prefix+2]), fmt.successful_payloads
-        fmt.add_successful('flush_ruleset', ret)
-        return True, "", fmt.successful_payloads
-
-
-    status, msg, successful_payloads = run_podnet(enabled, 3120, {})
-    if status == False:
-        return status, msg
-
-    status, msg, successful_payloads = run_podnet(disabled, 3160, successful_payloads)
+        rcc = _rcc(podnet_node, rcc_factory)
+        fmt = _formatter(config_file, podnet_node, podnet_node == enabled, successful_payloads)
+
+        status, msg = run_steps(rcc, fmt, payloads, SCRUB_STEPS, prefix, messages)
+        return status, msg, fmt.successful_payloads
+
+    # The nodes run concurrently, and only once if enabled and disabled are the same node
+    successful_payloads = {}
+    status, msg = _results(run_podnets(
+        run_podnet,
+        (enabled, 3120, successful_payloads),
+        (disabled, 3160, successful_payloads),
+    ))
     if status == False:
         return status, msg
 
-    return True, messages[1000]
+    return True, f'1000: Successfully scrubbed default firewall in project name space {namespace} on both PodNet nodes.'
@@ -2,18 +2,21 @@
 Primitive to Build, Read and Scrub dnsmasq for VRF name space DHCP on PodNet HA
 """
 # stdlib
-import json
-import os
+import base64
 from typing import Tuple
 # lib
-from cloudcix.rcc import CHANNEL_SUCCESS, comms_ssh
+from cloudcix.rcc import CHANNEL_SUCCESS
 # local
 from cloudcix_primitives.utils import (
     check_template_data,
-    load_pod_config,
+    get_ssh_session,
     JINJA_ENV,
     PodnetErrorFormatter,
-    SSHCommsWrapper,
+    run_podnets,
+    run_steps,
+    sectioned_payload,
+    split_sections,
+    with_pod_config,
 )
 
 
@@ -25,12 +28,173 @@ __all__ = [
 
 SUCCESS_CODE = 0
 
+# Loaded and compiled once at import rather than looked up through the loader on every build()
+CONFIG_TEMPLATE = JINJA_ENV.get_template('dhcp_ns/dnsmasq.conf.j2')
+HOSTS_TEMPLATE = JINJA_ENV.get_template('dhcp_ns/dnsmasq.hosts.j2')
+
+# Message templates, module level so a call does not build them all up front. Only the success message and the
+# one failed at are formatted, with the name space's file paths as {config_path} and {hosts_path}.
+BUILD_MESSAGES = {
+    1000: 'Successfully created {config_path} and started dnsmasq process on both PodNet nodes.',
+    3019: 'Failed to render jinja2 template for {config_path}',
+    3020: 'Failed to render jinja2 template for {hosts_path}',
+
+    3022: 'Failed to connect to the enabled PodNet for create_config payload: ',
+    3023: 'Failed to run create_config payload on the enabled PodNet. Payload exited with status ',
+    3024: 'Failed to connect to the enabled PodNet for create_hosts payload: ',
+    3025: 'Failed to run create_hosts payload on the enabled PodNet. Payload exited with status ',
+    3026: 'Failed to connect to the enabled PodNet for reload_dnsmasq payload: ',
+    3027: 'Failed to run reload_dnsmasq payload on the enabled PodNet. Payload exited with status ',
+
+    3062: 'Failed to connect to the disabled PodNet for create_config payload: ',
+    3063: 'Failed to run create_config payload on the disabled PodNet. Payload exited with status ',
+    3064: 'Failed to connect to the disabled PodNet for create_hosts payload: ',
+    3065: 'Failed to run create_hosts payload on the disabled PodNet. Payload exited with status ',
+    3066: 'Failed to connect to the disabled PodNet for reload_dnsmasq payload: ',
+    3067: 'Failed to run reload_dnsmasq payload on the disabled PodNet. Payload exited with status ',
+}
+
+READ_MESSAGES = {
+    1200: 'dnsmasq is running on both PodNet nodes.',
+
+    3221: 'Failed to connect to the enabled PodNet for read payload: ',
+    3222: 'Failed to run read_config payload on the enabled PodNet. Payload exited with status ',
+    3224: 'Failed to run read_hosts payload on the enabled PodNet. Payload exited with status ',
+    3226: 'Failed to run read_pidfile payload on the enabled PodNet. Payload exited with status ',
+    3228: 'Failed to execute find_process payload on the enabled PodNet node. Payload exited with status ',
+    3229: 'read_config payload on the enabled PodNet only returned the first {limit} bytes of {path}',
+    3230: 'read_hosts payload on the enabled PodNet only returned the first {limit} bytes of {path}',
+    3231: 'read_pidfile payload on the enabled PodNet only returned the first {limit} bytes of {path}',
+
+    3251: 'Failed to connect to the disabled PodNet for read payload: ',
+    3252: 'Failed to run read_config payload on the disabled PodNet. Payload exited with status ',
+    3254: 'Failed to run read_hosts payload on the disabled PodNet. Payload exited with status ',
+    3256: 'Failed to run read_pidfile payload on the disabled PodNet. Payload exited with status ',
+    3258: 'Failed to execute find_process payload on the disabled PodNet node. Payload exited with status ',
+    3259: 'read_config payload on the disabled PodNet only returned the first {limit} bytes of {path}',
+    3260: 'read_hosts payload on the disabled PodNet only returned the first {limit} bytes of {path}',
+    3261: 'read_pidfile payload on the disabled PodNet only returned the first {limit} bytes of {path}',
+}
+
+SCRUB_MESSAGES = {
+    1100: 'Successfully stopped dnsmasq process and deleted {config_path}, {hosts_path}.',
+
+    3122: 'Failed to connect to the enabled PodNet for delete_config payload: ',
+    3123: 'Failed to run delete_config payload on the enabled PodNet. Payload exited with status ',
+    3124: 'Failed to connect to the enabled PodNet for stop_dnsmasq payload: ',
+    3125: 'Failed to run stop_dnsmasq payload on the enabled PodNet. Payload exited with status ',
+
+    3162: 'Failed to connect to the disabled PodNet for delete_config payload: ',
+    3163: 'Failed to run delete_config payload on the disabled PodNet. Payload exited with status ',
+    3164: 'Failed to connect to the disabled PodNet for stop_dnsmasq payload: ',
+    3165: 'Failed to run stop_dnsmasq payload on the disabled PodNet. Payload exited with status ',
+}
+
+# (payload name, message offset) in the order build() and scrub() run their payloads. A payload's channel error
+# message is prefix + offset, its payload error message prefix + offset + 1.
+BUILD_STEPS = (
+    ('create_config', 2),
+    ('create_hosts', 4),
+    ('reload_dnsmasq', 6),
+)
+SCRUB_STEPS = (
+    ('stop_dnsmasq', 4),
+    ('delete_config', 2),
+)
+
+# (payload name, data_dict key, payload error message offset, truncation message offset) for the sections of
+# read()'s payload, which runs all of them as one sectioned_payload(). Offsets 3, 5 and 7 were the connection errors
+# of the separate read_hosts, read_pidfile and find_process payloads, and are not reused.
+READ_SECTIONS = (
+    ('read_config', 'config', 2, 9),
+    ('read_hosts', 'hosts', 4, 10),
+    ('read_pidfile', 'pidfile', 6, 11),
+    ('find_process', 'pid', 8, None),
+)
+
+# Most bytes of a file read() transfers. Larger files are returned truncated, with an error message.
+READ_LIMIT = 1024 * 1024
+
+# (PodNet node, path) -> (stamp, contents) of the files read() fetched last, see _read_file_payload(). Cleared
+# when it reaches READ_CACHE_SIZE entries.
+READ_CACHE = {}
+READ_CACHE_SIZE = 1024
+
+
+def _find_process_payload(config_path):
+    """
+    Returns a payload printing the pids of the dnsmasq instances started with config_path, one per line, using a
+    single pgrep process. It exits 0 whether or not any were found. Bracketing the first letter and escaping the
+    dots keeps the pattern from matching the command line of the shell running the payload, which contains the
+    pattern itself.
+    """
+    pattern = '[d]nsmasq --conf-file=' + config_path.replace('.', '\\.')
+    return f"pgrep -f '{pattern}'; [ $? -le 1 ]"
+
+
+def _running_pid_payload(pidfile, config_path):
+    """
+    Returns a shell condition that succeeds, with $pid set to the pid dnsmasq recorded in pidfile, if that process
+    is still running and is the dnsmasq started with config_path. A pidfile left behind by a crashed dnsmasq may
+    name an unrelated process that reused the pid, so the process's command line must contain the exact
+    --conf-file argument. That costs a single grep on the PodNet, still cheaper than a _find_process_payload().
+    """
+    return (
+        f'read -r pid 2>/dev/null < {pidfile} && [ "$pid" -gt 0 ] 2>/dev/null && '
+        f"grep -qzxF -- '--conf-file={config_path}' /proc/$pid/cmdline 2>/dev/null"
+    )
+
 
+def _read_file_payload(path, cached):
+    """
+    Returns a payload printing a stamp line identifying the current version of path (inode, modification time
+    and size), followed by at most READ_LIMIT bytes of its contents. The contents are left out if the stamp
+    matches the one in cached, the (stamp, contents) tuple from READ_CACHE for this file, if any.
+    """
+    known = '' if cached is None else cached[0]
+    return (
+        f'stamp=$(stat -c "%i %y %s" {path}) && echo "$stamp" && '
+        f'{{ [ "$stamp" = "{known}" ] || head -c {READ_LIMIT} {path}; }}'
+    )
+
+
+def _read_file_result(podnet_node, path, cached, output):
+    """
+    Returns the contents of path from the output of the _read_file_payload() built with cached, taking them from
+    cached if they were left out, and records them in READ_CACHE.
+    :return: tuple of the contents and a flag that is True if the file is larger than READ_LIMIT, and so the
+        contents only hold its first READ_LIMIT bytes
+    """
+    stamp, _, contents = output.partition('\n')
+    # the stamp ends with the file's full size
+    size = stamp.rsplit(' ', 1)[-1]
+    truncated = size.isdecimal() and int(size) > READ_LIMIT
+    if cached is not None and cached[0] == stamp:
+        return cached[1], truncated
+    if len(READ_CACHE) >= READ_CACHE_SIZE:
+        READ_CACHE.clear()
+    READ_CACHE[(podnet_node, path)] = (stamp, contents)
+    return contents, truncated
+
+
+def _write_file_payload(path, content):
+    """
+    Returns a payload writing content to path. The content travels base64 encoded, so the remote shell has
+    nothing to expand or parse in it, whatever characters (or an `EOF` line) the rendered file contains.
+    """
+    encoded = base64.b64encode(content.encode()).decode()
+    return f"printf '%s' {encoded} | base64 -d > {path}"
+
+
+@with_pod_config
 def build(
         namespace: str,
         dhcp_ranges: list,
         dhcp_hosts: list,
         config_file=None,
+        *,
+        enabled: str,
+        disabled: str,
 ) -> Tuple[bool, str]:
     """
     description:
@@ -60,76 +224,45 @@ def build(
     dnsmasq_hosts_path = f'/etc/netns/{namespace}/dnsmasq.hosts'
     pidfile= f'/etc/netns/{namespace}/dnsmasq.pid'
 
-    # Define message
-    messages = {
-        1000: f'1000: Successfully created {dnsmasq_config_path} and started dnsmasq process on both PodNet nodes.',
-        3019: f'3019: Failed to render jinja2 template for {dnsmasq_config_path}',
-        3020: f'3020: Failed to render jinja2 template for {dnsmasq_hosts_path}',
-
-        3021: f'Failed to connect to the enabled PodNet for find_process payload: ',
-        3022: f'Failed to connect to the enabled PodNet for create_config payload: ',
-        3023: f'Failed to run create_config payload on the enabled PodNet. Payload exited with status ',
-        3024: f'Failed to connect to the enabled PodNet for create_hosts payload: ',
-        3025: f'Failed to run create_hosts payload on the enabled PodNet. Payload exited with status ',
-        3026: f'Failed to connect to the enabled PodNet for reload_dnsmasq payload: ',
-        3027: f'Failed to run reload_dnsmasq payload on the enabled PodNet. Payload exited with status ',
-        3028: f'Failed to connect to the enabled PodNet for start_dnsmasq payload: ',
-        3029: f'Failed to run start_dnsmasq payload on the enabled PodNet. Payload exited with status ',
-
-        3061: f'Failed to connect to the disabled PodNet for find_process payload: ',
-        3062: f'Failed to connect to the disabled PodNet for create_config payload: ',
-        3063: f'Failed to run create_config payload on the disabled PodNet. Payload exited with status ',
-        3064: f'Failed to connect to the disabled PodNet for create_hosts payload: ',
-        3065: f'Failed to run create_hosts payload on the disabled PodNet. Payload exited with status ',
-        3066: f'Failed to connect to the disabled PodNet for reload_dnsmasq payload: ',
-        3067: f'Failed to run reload_dnsmasq payload on the disabled PodNet. Payload exited with status ',
-        3068: f'Failed to connect to the disabled PodNet for start_dnsmasq payload: ',
-        3069: f'Failed to run start_dnsmasq payload on the disabled PodNet. Payload exited with status ',
+    messages = BUILD_MESSAGES
 
-    }
-
-    # Default config_file if it is None
-    if config_file is None:
-        config_file = '/opt/robot/config.json'
-
-    status, config_data, msg = load_pod_config(config_file)
-    if not status:
-      if config_data['raw'] is None:
-          return False, msg
-      else:
-          return False, msg + "\nJSON dump of raw configuration:\n" + json.dumps(config_data['raw'],
-              indent=2,
-              sort_keys=True)
-    enabled = config_data['processed']['enabled']
-    disabled = config_data['processed']['disabled']
-
-    # template data for required files
+    # template data for required files. The host and range lines are uniform, so they are joined here rather
+    # than looped over in the templates.
     template_data = {
-        'hosts': dhcp_hosts,
+        'hosts_block': ''.join(f"{host['mac_address']},{host['ip_address']}\n" for host in dhcp_hosts),
         'hostsfile': dnsmasq_hosts_path,
         'pidfile': pidfile,
-        'ranges': dhcp_ranges,
+        'ranges_block': ''.join(f"dhcp-range={r['ip_address']}/{r['mask']}\n" for r in dhcp_ranges),
     }
     # Templates
     # dnsmasq.conf file
-    template = JINJA_ENV.get_template('dchp_ns/dnsmasq.conf.j2')
-    template_verified, template_error = check_template_data(template_data, template)
+    template_verified, template_error = check_template_data(template_data, CONFIG_TEMPLATE)
     if not template_verified:
-        return False, f'3019: {messages[3019]}'
+        return False, '3019: ' + messages[3019].format(config_path=dnsmasq_config_path)
 
-    dnsmasq_conf = template.render(**template_data)
+    dnsmasq_conf = CONFIG_TEMPLATE.render(**template_data)
 
     # dnsmasq.hosts file
-    template = JINJA_ENV.get_template('dchp_ns/dnsmasq.hosts.j2')
-    template_verified, template_error = check_template_data(template_data, template)
+    template_verified, template_error = check_template_data(template_data, HOSTS_TEMPLATE)
     if not template_verified:
-        return False, f'3020: {messages[3020]}'
-
-    dnsmasq_hosts = template.render(**template_data)
-
+        return False, '3020: ' + messages[3020].format(hosts_path=dnsmasq_hosts_path)
+
+    dnsmasq_hosts = HOSTS_TEMPLATE.render(**template_data)
+
+    # The payloads are the same for both nodes, so the files are encoded once rather than per node
+    payloads = {
+        'create_config': _write_file_payload(dnsmasq_config_path, dnsmasq_conf),
+        'create_hosts': _write_file_payload(dnsmasq_hosts_path, dnsmasq_hosts),
+        # Reloads the dnsmasq instance serving this name space if its pidfile names it and starts it otherwise
+        'reload_dnsmasq': (
+            f'if {_running_pid_payload(pidfile, dnsmasq_config_path)}; then kill -HUP "$pid"; '
+            f'else ip netns exec {namespace} dnsmasq --conf-file={dnsmasq_config_path}; fi'
+        ),
+    }
 
     def run_podnet(podnet_node, prefix, successful_payloads):
-        rcc = SSHCommsWrapper(comms_ssh, podnet_node, 'robot')
+        # One persistent connection per node carries all of its payloads
+        rcc = get_ssh_session(podnet_node, 'robot')
         fmt = PodnetErrorFormatter(
             config_file,
             podnet_node,
@@ -138,82 +271,29 @@ def build(
             successful_payloads
         )
 
-        dnsmasq_config_path_grepsafe = dnsmasq_config_path.replace('.', '\.')
-        dnsmasq_hosts_path_grepsafe = dnsmasq_hosts_path.replace('.', '\.')
-
-        payloads = {
-            'create_config': "\n".join([
-                f'tee {dnsmasq_config_path} <<EOF',
-                dnsmasq_conf,
-                "EOF"
-            ]),
-            'create_hosts': "\n".join([
-                f'tee {dnsmasq_hosts_path} <<EOF',
-                dnsmasq_hosts,
-                "EOF"
-            ]),
-            'find_process': "ps auxw | grep dnsmasq | grep -v grep | grep '%s' | awk '{print $2}'" % dnsmasq_config_path_grepsafe,
-            'start_dnsmasq': f'ip netns exec {namespace} dnsmasq --conf-file={dnsmasq_config_path}',
-            'reload_dnsmasq': 'kill -HUP %s',
-        }
-
-        ret = rcc.run(payloads['find_process'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+1}: " + messages[prefix+1]), fmt.successful_payloads
-        start_dnsmasq = True
-        if ret["payload_code"] == SUCCESS_CODE:
-            if ret["payload_message"] != "":
-                # No need to start dnsmasq if it runs already
-                start_dnsmasq = False
-                payloads['reload_dnsmasq'] = payloads['reload_dnsmasq'] % ret['payload_message'].strip()
-        fmt.add_successful('find_process', ret)
-
-        ret = rcc.run(payloads['create_config'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+2}: " + messages[prefix+2]), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f"{prefix+3}: " + messages[prefix+3]), fmt.successful_payloads
-        fmt.add_successful('create_config', ret)
-
-        ret = rcc.run(payloads['create_hosts'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+4}: " + messages[prefix+4]), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f"{prefix+5}: " + messages[prefix+5]), fmt.successful_payloads
-        fmt.add_successful('create_hosts', ret)
-
-        if start_dnsmasq:
-            ret = rcc.run(payloads['start_dnsmasq'])
-            if ret["channel_code"] != CHANNEL_SUCCESS:
-                return False, fmt.channel_error(ret, f"{prefix+8}: " + messages[prefix+8]), fmt.successful_payloads
-            if ret["payload_code"] != SUCCESS_CODE:
-                return False, fmt.payload_error(ret, f"{prefix+9}: " + messages[prefix+9]), fmt.successful_payloads
-            fmt.add_successful('start_dnsmasq', ret)
-        else:
-            ret = rcc.run(payloads['reload_dnsmasq'])
-            if ret["channel_code"] != CHANNEL_SUCCESS:
-                return False, fmt.channel_error(ret, f"{prefix+6}: " + messages[prefix+6]), fmt.successful_payloads
-            if ret["payload_code"] != SUCCESS_CODE:
-                return False, fmt.payload_error(ret, f"{prefix+7}: " + messages[prefix+7]), fmt.successful_payloads
-            fmt.add_successful('reload_dnsmasq', ret)
-
+        status, msg = run_steps(rcc, fmt, payloads, BUILD_STEPS, prefix, messages)
+        return status, msg, fmt.successful_payloads
 
-        return True, "", fmt.successful_payloads
+    successful_payloads = {}
+    results = run_podnets(
+        run_podnet,
+        (enabled, 3020, successful_payloads),
+        (disabled, 3060, successful_payloads),
+    )
+    for status, msg, _ in results:
+        if status == False:
+            return status, msg
 
-    status, msg, successful_payloads = run_podnet(enabled, 3020, {})
-    if status == False:
-        return status, msg
-
-    status, msg, successful_payloads = run_podnet(disabled, 3060, successful_payloads)
-    if status == False:
-        return status, msg
-
-    return True, messages[1000]
+    return True, '1000: ' + messages[1000].format(config_path=dnsmasq_config_path)
 
 
+@with_pod_config(returns_data=True)
 def read(
         namespace: str,
-        config_file=None
+        config_file=None,
+        *,
+        enabled: str,
+        disabled: str,
 ) -> Tuple[bool, dict, str]:
     """
     description:
@@ -273,50 +353,22 @@ def read(
     dnsmasq_hosts_path = f'/etc/netns/{namespace}/dnsmasq.hosts'
     pidfile= f'/etc/netns/{namespace}/dnsmasq.pid'
 
-    # Define message
-    messages = {
-        1200: f'dnsmasq is running on both PodNet nodes.',
-
-        3221: f'Failed to connect to the enabled PodNet for read_config payload: ',
-        3222: f'Failed to run read_config payload on the enabled PodNet. Payload exited with status ',
-        3223: f'Failed to connect to the enabled PodNet for read_hosts payload: ',
-        3224: f'Failed to run read_hosts payload on the enabled PodNet. Payload exited with status ',
-        3225: f'Failed to connect to the enabled PodNet for read_pidfile payload: ',
-        3226: f'Failed to run read_pidfile payload on the enabled PodNet. Payload exited with status ',
-        3227: f'Failed to connect to the enabled PodNet for find_process payload: ',
-        3228: f'Failed to execute find_process payload on the enabled PodNet node. Payload exited with status ',
-
-        3251: f'Failed to connect to the disabled PodNet for read_config payload: ',
-        3252: f'Failed to run read_config payload on the disabled PodNet. Payload exited with status ',
-        3253: f'Failed to connect to the disabled PodNet for read_hosts payload: ',
-        3254: f'Failed to run read_hosts payload on the disabled PodNet. Payload exited with status ',
-        3255: f'Failed to connect to the disabled PodNet for read_pidfile payload: ',
-        3256: f'Failed to run read_pidfile payload on the disabled PodNet. Payload exited with status ',
-        3257: f'Failed to connect to the disabled PodNet for find_process payload: ',
-        3258: f'Failed to execute find_process payload on the disabled PodNet node. Payload exited with status ',
+    messages = READ_MESSAGES
 
+    read_files = {
+        'read_config': dnsmasq_config_path,
+        'read_hosts': dnsmasq_hosts_path,
+        'read_pidfile': pidfile,
     }
-
-    # Default config_file if it is None
-    if config_file is None:
-        config_file = '/opt/robot/config.json'
-
-    status, config_data, msg = load_pod_config(config_file)
-    if not status:
-      if config_data['raw'] is None:
-          return False, None, msg
-      else:
-          return False, msg + "\nJSON dump of raw configuration:\n" + json.dumps(config_data['raw'],
-              indent=2,
-              sort_keys=True)
-    enabled = config_data['processed']['enabled']
-    disabled = config_data['processed']['disabled']
+    # Unlike the file reads, the process lookup does not depend on the node
+    find_process = _find_process_payload(dnsmasq_config_path)
 
     def run_podnet(podnet_node, prefix, successful_payloads, data_dict):
         retval = True
         data_dict[podnet_node] = {}
 
-        rcc = SSHCommsWrapper(comms_ssh, podnet_node, 'robot')
+        # One persistent connection per node carries all of its payloads
+        rcc = get_ssh_session(podnet_node, 'robot')
         fmt = PodnetErrorFormatter(
             config_file,
             podnet_node,
@@ -325,77 +377,66 @@ def read(
             successful_payloads
         )
 
-
-        dnsmasq_config_path_grepsafe = dnsmasq_config_path.replace('.', '\.')
-        dnsmasq_hosts_path_grepsafe = dnsmasq_hosts_path.replace('.', '\.')
-
+        # Files whose contents are only transferred if they changed since this node's last read()
+        cached = {name: READ_CACHE.get((podnet_node, path)) for name, path in read_files.items()}
 
         # define payloads
 
         payloads = {
-          'read_config': f'cat {dnsmasq_config_path}',
-          'read_hosts': f'cat {dnsmasq_hosts_path}',
-          'read_pidfile': f'cat {pidfile}',
-          'find_process': "ps auxw | grep dnsmasq | grep -v grep | grep '%s' | awk '{print $2}'" % dnsmasq_config_path_grepsafe,
+          'read_config': _read_file_payload(dnsmasq_config_path, cached['read_config']),
+          'read_hosts': _read_file_payload(dnsmasq_hosts_path, cached['read_hosts']),
+          'read_pidfile': _read_file_payload(pidfile, cached['read_pidfile']),
+          'find_process': find_process,
         }
 
-        ret = rcc.run(payloads['read_config'])
+        # All four reads go out as one payload and come back as one output, split into a section per read
+        ret = rcc.run(sectioned_payload(payloads))
         if ret["channel_code"] != CHANNEL_SUCCESS:
-            retval = False
             fmt.store_channel_error(ret, f"{prefix+1}: " + messages[prefix+1])
-        if ret["payload_code"] != SUCCESS_CODE:
-            retval = False
-            fmt.store_payload_error(ret, f"{prefix+2}: " + messages[prefix+2])
-        else:
-            data_dict[podnet_node]['config'] = ret["payload_message"].strip()
-            fmt.add_successful('read_config', ret)
-
-        ret = rcc.run(payloads['read_hosts'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            retval = False
-            fmt.store_channel_error(ret, f"{prefix+3}: " + messages[prefix+3])
-        if ret["payload_code"] != SUCCESS_CODE:
-            retval = False
-            fmt.store_payload_error(ret, f"{prefix+4}: " + messages[prefix+4])
-        else:
-            data_dict[podnet_node]['hosts'] = ret["payload_message"].strip()
-            fmt.add_successful('read_hosts', ret)
-
-        ret = rcc.run(payloads['read_pidfile'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            retval = False
-            fmt.store_channel_error(ret, f"{prefix+5}: " + messages[prefix+3])
-        if ret["payload_code"] != SUCCESS_CODE:
-            retval = False
-            fmt.store_payload_error(ret, f"{prefix+6}: " + messages[prefix+4])
-        else:
-            data_dict[podnet_node]['pidfile'] = ret["payload_message"].strip()
-            fmt.add_successful('read_pidfile', ret)
-
-        ret = rcc.run(payloads['find_process'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            retval = False
-            fmt.store_channel_error(ret, f"{prefix+7}: " + messages[prefix+5])
-        if ret["payload_code"] != SUCCESS_CODE:
-            retval = False
-            fmt.store_payload_error(ret, f"{prefix+8}: " + messages[prefix+6])
-        else:
-            pid = ret["payload_message"].strip()
-            if pid == "":
-                fmt.store_payload_error(ret, f"{prefix+8}: " + messages[prefix+6])
-            else:
-                data_dict[podnet_node]['pid'] = pid
-                fmt.add_successful('find_process', ret)
+            return False, fmt.message_list, fmt.successful_payloads, data_dict
+        sections = split_sections(ret["payload_message"])
+
+        for name, key, offset, truncated_offset in READ_SECTIONS:
+            section_ret = dict(ret)
+            section_ret["payload_code"], section_ret["payload_message"] = sections.get(name, (None, ''))
+            if section_ret["payload_code"] != SUCCESS_CODE:
+                retval = False
+                fmt.store_payload_error(section_ret, f"{prefix+offset}: " + messages[prefix+offset])
+                continue
+            value = section_ret["payload_message"]
+            truncated = False
+            if name in read_files:
+                value, truncated = _read_file_result(podnet_node, read_files[name], cached[name], value)
+            value = value.strip()
+            if key == 'pid' and value == "":
+                fmt.store_payload_error(section_ret, f"{prefix+offset}: " + messages[prefix+offset])
+                continue
+            data_dict[podnet_node][key] = value
+            if truncated:
+                # the partial contents are kept in data_dict, but the read does not count as successful
+                retval = False
+                fmt.message_list.append(
+                    f"{prefix+truncated_offset}: "
+                    + messages[prefix+truncated_offset].format(limit=READ_LIMIT, path=read_files[name]),
+                )
+                continue
+            fmt.add_successful(name, section_ret)
 
         return retval, fmt.message_list, fmt.successful_payloads, data_dict
 
-    retval_enabled, msg_list_enabled, successful_payloads, data_dict = run_podnet(enabled, 3220, {}, {})
-
-    retval_disabled, msg_list_disabled, successful_payloads, data_dict = run_podnet(disabled, 3250, successful_payloads, data_dict)
+    successful_payloads = {}
+    # Keyed up front so the result lists the enabled node first regardless of which node finishes first
+    data_dict = {enabled: {}, disabled: {}}
+    (retval_enabled, msg_list_enabled, _, _), (retval_disabled, msg_list_disabled, _, _) = run_podnets(
+        run_podnet,
+        (enabled, 3220, successful_payloads, data_dict),
+        (disabled, 3250, successful_payloads, data_dict),
+    )
 
     msg_list = list()
     msg_list.extend(msg_list_enabled)
-    msg_list.extend(msg_list_disabled)
+    if disabled != enabled:
+        msg_list.extend(msg_list_disabled)
 
     if not (retval_enabled and retval_disabled):
         return False, data_dict, msg_list
@@ -404,9 +445,13 @@ def read(
 
 
 
+@with_pod_config
 def scrub(
         namespace: str,
         config_file=None,
+        *,
+        enabled: str,
+        disabled: str,
 ) -> Tuple[bool, str]:
     """
     description: |
@@ -433,40 +478,19 @@ def scrub(
     dnsmasq_hosts_path = f'/etc/netns/{namespace}/dnsmasq.hosts'
     pidfile = f'/etc/netns/{namespace}/dnsmasq.pid'
 
-    # Define message
-    messages = {
-        1100: f'Successfully stopped dnsmasq process and deleted {dnsmasq_config_path}, {dnsmasq_hosts_path}.',
-
-        3121: f'Failed to connect to the enabled PodNet for find_process payload: ',
-        3122: f'Failed to connect to the enabled PodNet for delete_config payload: ',
-        3123: f'Failed to run delete_config payload on the enabled PodNet. Payload exited with status ',
-        3124: f'Failed to connect to the enabled PodNet for stop_dnsmasq payload: ',
-        3125: f'Failed to run stop_dnsmasq payload on the enabled PodNet. Payload exited with status ',
-
-        3161: f'Failed to connect to the disabled PodNet for find_process payload: ',
-        3162: f'Failed to connect to the disabled PodNet for delete_config payload: ',
-        3163: f'Failed to run delete_config payload on the disabled PodNet. Payload exited with status ',
-        3164: f'Failed to connect to the disabled PodNet for stop_dnsmasq payload: ',
-        3165: f'Failed to run stop_dnsmasq payload on the disabled PodNet. Payload exited with status ',
-    }
+    messages = SCRUB_MESSAGES
 
-    # Default config_file if it is None
-    if config_file is None:
-        config_file = '/opt/robot/config.json'
-
-    status, config_data, msg = load_pod_config(config_file)
-    if not status:
-      if config_data['raw'] is None:
-          return False, msg
-      else:
-          return False, msg + "\nJSON dump of raw configuration:\n" + json.dumps(config_data['raw'],
-              indent=2,
-              sort_keys=True)
-    enabled = config_data['processed']['enabled']
-    disabled = config_data['processed']['disabled']
+    # define payloads, the same for both nodes
+    payloads = {
+       'delete_config': f'rm -f {dnsmasq_config_path} {dnsmasq_hosts_path} {pidfile}',
+       # Stops the dnsmasq instance serving this name space, if its pidfile names it. It runs before
+       # delete_config, which removes the pidfile.
+       'stop_dnsmasq': f'if {_running_pid_payload(pidfile, dnsmasq_config_path)}; then kill -TERM "$pid"; fi',
+    }
 
     def run_podnet(podnet_node, prefix, successful_payloads):
-        rcc = SSHCommsWrapper(comms_ssh, podnet_node, 'robot')
+        # One persistent connection per node carries all of its payloads
+        rcc = get_ssh_session(podnet_node, 'robot')
         fmt = PodnetErrorFormatter(
             config_file,
             podnet_node,
@@ -475,50 +499,18 @@ def scrub(
             successful_payloads
         )
 
-        dnsmasq_config_path_grepsafe = dnsmasq_config_path.replace('.', '\.')
+        status, msg = run_steps(rcc, fmt, payloads, SCRUB_STEPS, prefix, messages)
+        return status, msg, fmt.successful_payloads
 
-        # define payloads
-        payloads = {
-           'find_process': "ps auxw | grep dnsmasq | grep -v grep | grep %s | awk '{print $2}'" % dnsmasq_config_path_grepsafe,
-           'delete_config': f'rm -f {dnsmasq_config_path} {dnsmasq_hosts_path} {pidfile}',
-           'stop_dnsmasq': 'kill -TERM %s',
-        }
+    successful_payloads = {}
+    results = run_podnets(
+        run_podnet,
+        (enabled, 3120, successful_payloads),
+        (disabled, 3160, successful_payloads),
+    )
+    for status, msg, _ in results:
+        if status == False:
+            return status, msg
 
-        ret = rcc.run(payloads['find_process'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+1}: " + messages[prefix+1]), fmt.successful_payloads
-        stop_dnsmasq = False
-        if ret["payload_code"] == SUCCESS_CODE:
-            if ret["payload_message"] != "":
-                # No need to start dnsmasq if it runs already
-                stop_dnsmasq = True
-                payloads['stop_dnsmasq'] = payloads['stop_dnsmasq'] % ret['payload_message'].strip()
-        fmt.add_successful('find_process', ret)
-
-        ret = rcc.run(payloads['delete_config'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+2}: " + messages[prefix+2]), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f"{prefix+3}: " + messages[prefix+3]), fmt.successful_payloads
-        fmt.add_successful('delete_config', ret)
-
-        if stop_dnsmasq:
-            ret = rcc.run(payloads['stop_dnsmasq'])
-            if ret["channel_code"] != CHANNEL_SUCCESS:
-                return False, fmt.channel_error(ret, f"{prefix+4}: " + messages[prefix+4]), fmt.successful_payloads
-            if ret["payload_code"] != SUCCESS_CODE:
-                return False, fmt.payload_error(ret, f"{prefix+5}: " + messages[prefix+5]), fmt.successful_payloads
-            fmt.add_successful('stop_dnsmasq', ret)
-
-        return True, "", fmt.successful_payloads
-
-    status, msg, successful_payloads = run_podnet(enabled, 3120, {})
-    if status == False:
-        return status, msg
-
-    status, msg, successful_payloads = run_podnet(disabled, 3160, successful_payloads)
-    if status == False:
-        return status, msg
-
-    return True, messages[1100]
+    return True, messages[1100].format(config_path=dnsmasq_config_path, hosts_path=dnsmasq_hosts_path)
 
@@ -2,26 +2,138 @@
 Primitive to Build and Delete directories on PodNet HA
 """
 # stdlib
-import ipaddress
-import json
-from pathlib import Path
+import shlex
+from functools import partial
 from typing import Any, Dict, List, Tuple
 # lib
-from cloudcix.rcc import CHANNEL_SUCCESS, comms_ssh, CONNECTION_ERROR, VALIDATION_ERROR
+from cloudcix.rcc import CHANNEL_SUCCESS
 # local
-from cloudcix_primitives.utils import load_pod_config, PodnetErrorFormatter, SSHCommsWrapper
+from cloudcix_primitives.utils import (
+    get_ssh_session,
+    PodnetErrorFormatter,
+    run_podnets,
+    sectioned_payload,
+    split_sections,
+    with_pod_config,
+)
 
 
 __all__ = [
     'build',
     'read',
+    'read_many',
     'scrub',
 ]
 
 SUCCESS_CODE = 0
 
+PAYLOAD_CHANNELS = {'payload_message': 'STDOUT', 'payload_error': 'STDERR'}
 
-def build(path: str, config_file=None) -> Tuple[bool, str]:
+# Message templates, module level so a call does not build them all up front. Only the success messages are
+# formatted, with the directory's path as {path}.
+BUILD_MESSAGES = {
+    1000: 'Successfully created directory {path} on both PodNet nodes.',
+    3021: 'Failed to connect to the enabled PodNet node for create_path payload: ',
+    3022: 'Failed to run create path payload on the enabled PodNet. Payload exited with status ',
+
+    3031: 'Failed to connect to the disabled PodNet node for create_path payload: ',
+    3032: 'Failed to run create path payload on the disabled PodNet. Payload exited with status ',
+}
+
+READ_MESSAGES = {
+    3201: 'Invalid entry_format {entry_format}, expected one of: stat, fields',
+    1200: 'Successfully read directory {path} on both podnet nodes.',
+    3221: 'Failed to connect to the enabled PodNet node for find_path payload: ',
+    3222: 'Failed to run find path payload on the enabled PodNet. Payload exited with status ',
+
+    3231: 'Failed to connect to the disabled PodNet node for find_path payload: ',
+    3232: 'Failed to run find path payload on the disabled PodNet. Payload exited with status ',
+}
+
+READ_MANY_MESSAGES = {
+    3201: 'Invalid entry_format {entry_format}, expected one of: stat, fields',
+    1201: 'Successfully read {count} directories on both podnet nodes.',
+    3241: 'Failed to connect to the enabled PodNet node for find_paths payload: ',
+    3242: 'Failed to run find path payload for {path} on the enabled PodNet. Payload exited with status ',
+
+    3251: 'Failed to connect to the disabled PodNet node for find_paths payload: ',
+    3252: 'Failed to run find path payload for {path} on the disabled PodNet. Payload exited with status ',
+}
+
+SCRUB_MESSAGES = {
+    1000: 'Successfully removed directory {path}',
+    3121: 'Failed to connect to the enabled PodNet node for delete_path payload: ',
+    3122: 'Failed to run delete_path payload on the enabled PodNet. Payload exited with status ',
+
+    3131: 'Failed to connect to the disabled PodNet node for delete_path payload: ',
+    3132: 'Failed to run delete_path payload on the disabled PodNet. Payload exited with status ',
+}
+
+# Payload templates for build() and scrub(), formatted with the shell quoted path as {path}
+CREATE_PATH_PAYLOAD = 'mkdir --parents -- {path}'
+DELETE_PATH_PAYLOAD = 'rm --recursive --force -- {path}'
+
+# stat format of the single line entries read() and read_many() return with entry_format='fields', see
+# _parse_stat_fields(). The name comes last so a '|' in it does not shift the other fields.
+STAT_FIELDS_FORMAT = '%F|%s|%Y|%a|%n'
+
+
+def _formatter(config_file, podnet_node, enabled, successful_payloads):
+    """
+    Returns a PodnetErrorFormatter for a payload that failed on podnet_node. Successful payloads record themselves
+    with PodnetErrorFormatter.record_successful(), so a run that does not fail never needs one.
+    """
+    return PodnetErrorFormatter(config_file, podnet_node, enabled, PAYLOAD_CHANNELS, successful_payloads)
+
+
+def _stat_payload(path, entry_format):
+    """
+    Returns a payload running stat on path, with its usual multi line output for entry_format 'stat' or a single
+    STAT_FIELDS_FORMAT line for 'fields'.
+    """
+    if entry_format == 'fields':
+        return f"stat --format='{STAT_FIELDS_FORMAT}' -- {shlex.quote(path)}"
+    return f'stat -- {shlex.quote(path)}'
+
+
+def _parse_stat_fields(output):
+    """
+    Parses the output of a _stat_payload() built with entry_format 'fields' into a dict with the path's name, file
+    type, size in bytes, modification time in seconds since the epoch and octal permission bits.
+    """
+    file_type, size, mtime, mode, name = output.strip().split('|', 4)
+    return {'name': name, 'type': file_type, 'size': int(size), 'mtime': int(mtime), 'mode': mode}
+
+
+def _run_payload(podnet_node, prefix, successful_payloads, *, name, payload, messages, config_file, enabled):
+    """
+    Runs build()'s or scrub()'s single payload, called name, on podnet_node. messages holds the error messages
+    indexed by message code, a channel error being prefix + 1 and a payload error prefix + 2.
+    :return: tuple of a boolean success flag, the formatted error message, if any, and successful_payloads
+    """
+    # The node's shared persistent connection, opened by the first primitive to reach it
+    rcc = get_ssh_session(podnet_node, 'robot')
+
+    ret = rcc.run(payload)
+    if ret["channel_code"] != CHANNEL_SUCCESS:
+        fmt = _formatter(config_file, podnet_node, podnet_node == enabled, successful_payloads)
+        return False, fmt.channel_error(ret, f"{prefix+1}: " + messages[prefix+1]), successful_payloads
+    if ret["payload_code"] != SUCCESS_CODE:
+        fmt = _formatter(config_file, podnet_node, podnet_node == enabled, successful_payloads)
+        return False, fmt.payload_error(ret, f"{prefix+2}: " + messages[prefix+2]), successful_payloads
+    PodnetErrorFormatter.record_successful(successful_payloads, podnet_node, name, ret)
+
+    return True, "", successful_payloads
+
+
+@with_pod_config
+def build(
+        path: str,
+        config_file=None,
+        *,
+        enabled: str,
+        disabled: str,
+) -> Tuple[bool, str]:
     """
     description:
         Creates directory on PodNet HA.
@@ -42,66 +154,39 @@ def build(path: str, config_file=None) -> Tuple[bool, str]:
         type: tuple
     """
 
-    # Define messages
-    messages = {
-        1000: f'Successfully created directory {path} on both PodNet nodes.',
-        3021: f'Failed to connect to the enabled PodNet node for create_path payload: ',
-        3022: f'Failed to run create path payload on the enabled PodNet. Payload exited with status ',
-
-        3031: f'Failed to connect to the disabled PodNet node for create_path payload: ',
-        3032: f'Failed to run create path payload on the disabled PodNet. Payload exited with status ',
-    }
-
-    # Default config_file if it is None
-    if config_file is None:
-        config_file = '/opt/robot/config.json'
-
-    status, config_data, msg = load_pod_config(config_file)
-    if not status:
-      if config_data['raw'] is None:
-          return False, msg
-      else:
-          return False, msg + "\nJSON dump of raw configuration:\n" + json.dumps(config_data['raw'],
-              indent=2,
-              sort_keys=True)
-    enabled = config_data['processed']['enabled']
-    disabled = config_data['processed']['disabled']
-
-    def run_podnet(podnet_node, prefix, successful_payloads):
-        rcc = SSHCommsWrapper(comms_ssh, podnet_node, 'robot')
-        fmt = PodnetErrorFormatter(
-            config_file,
-            podnet_node,
-            podnet_node == enabled,
-            {'payload_message': 'STDOUT', 'payload_error': 'STDERR'},
-            successful_payloads
-        )
-
-        payloads = {
-            'create_path':     f"mkdir --parents {path}",
-        }
-
-        ret = rcc.run(payloads['create_path'])
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+1}: " + messages[prefix+1]), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f"{prefix+2}: " + messages[prefix+2]), fmt.successful_payloads
-        fmt.add_successful('create_path', ret)
-
-        return True, "", fmt.successful_payloads
-
-    status, msg, successful_payloads = run_podnet(enabled, 3020, {})
-    if status == False:
-        return status, msg
-
-    status, msg, successful_payloads = run_podnet(disabled, 3030, successful_payloads)
-    if status == False:
-        return status, msg
-
-    return True, messages[1000]
-
-
-def read(path: str, config_file=None) -> Tuple[bool, Dict[str, Any], List[str]]:
+    messages = BUILD_MESSAGES
+
+    run_podnet = partial(
+        _run_payload,
+        name='create_path',
+        payload=CREATE_PATH_PAYLOAD.format(path=shlex.quote(path)),
+        messages=messages,
+        config_file=config_file,
+        enabled=enabled,
+    )
+
+    successful_payloads = {}
+    results = run_podnets(
+        run_podnet,
+        (enabled, 3020, successful_payloads),
+        (disabled, 3030, successful_payloads),
+    )
+    for status, msg, _ in results:
+        if status == False:
+            return status, msg
+
+    return True, messages[1000].format(path=path)
+
+
+@with_pod_config(returns_data=True)
+def read(
+        path: str,
+        config_file=None,
+        entry_format: str = 'stat',
+        *,
+        enabled: str,
+        disabled: str,
+) -> Tuple[bool, Dict[str, Any], List[str]]:
     """
     description:
         Gets the status of the directory on PodNet HA.
@@ -115,6 +200,12 @@ def read(path: str, config_file=None) -> Tuple[bool, Dict[str, Any], List[str]]:
             description: The path to the config.json file
             type: string
             required: false
+        entry_format:
+            description: |
+                'stat' for the full output of `stat <path>`, 'fields' for a dict of the path's name, type, size,
+                mtime and mode parsed from a single line, which is cheaper to transfer and to consume.
+            type: string
+            required: false
     return:
         description: |
             A list with 3 items: (1) a boolean status flag indicating if the
@@ -132,78 +223,193 @@ def read(path: str, config_file=None) -> Tuple[bool, Dict[str, Any], List[str]]:
               could be retrieved.
             properties:
               <podnet_ip>:
-                description: The output from the command "stat <path>"
+                description: The output from the command "stat <path>", or its fields as described for entry_format
         message_list:
             description: A list of comma seperated messages recording any errors encountered during the request.
             type: array
 
     """
-    # Define message
-    messages = {
-        1200: f'Successfully read directory {path} on both podnet nodes.',
-        3221: f'Failed to connect to the enabled PodNet node for find_path payload: ',
-        3222: f'Failed to run find path payload on the enabled PodNet. Payload exited with status ',
-
-        3231: f'Failed to connect to the disabled PodNet node for find_path payload: ',
-        3232: f'Failed to run find path payload on the disabled PodNet. Payload exited with status ',
-    }
+    messages = READ_MESSAGES
+
+    if entry_format not in ('stat', 'fields'):
+        return False, None, '3201: ' + messages[3201].format(entry_format=entry_format)
 
-    status, config_data, msg = load_pod_config(config_file)
-    if not status:
-      if config_data['raw'] is None:
-          return False, None, msg
-      else:
-          return False, msg + "\nJSON dump of raw configuration:\n" + json.dumps(config_data['raw'],
-              indent=2,
-              sort_keys=True)
-    enabled = config_data['processed']['enabled']
-    disabled = config_data['processed']['disabled']
+    # define payloads, built once for both nodes with the path quoted for the shell
+    payloads = {
+        'find_path':     _stat_payload(path, entry_format),
+    }
 
     def run_podnet(podnet_node, prefix, successful_payloads, data_dict):
-        retval = True
         data_dict[podnet_node] = {}
 
-        rcc = SSHCommsWrapper(comms_ssh, podnet_node, 'robot')
-        fmt = PodnetErrorFormatter(
-            config_file,
-            podnet_node,
-            podnet_node == enabled,
-            {'payload_message': 'STDOUT', 'payload_error': 'STDERR'},
-            successful_payloads
-        )
-
-        payloads = {
-            'find_path':     f"stat {path}",
-        }
+        # The node's shared persistent connection, opened by the first primitive to reach it
+        rcc = get_ssh_session(podnet_node, 'robot')
 
         ret = rcc.run(payloads['find_path'])
+        if ret["channel_code"] == CHANNEL_SUCCESS and ret["payload_code"] == SUCCESS_CODE:
+            entry = ret["payload_message"].strip()
+            if entry_format == 'fields':
+                entry = _parse_stat_fields(entry)
+            data_dict[podnet_node]['entry'] = entry
+            PodnetErrorFormatter.record_successful(successful_payloads, podnet_node, 'find_path', ret)
+            return True, [], successful_payloads, data_dict
+
+        fmt = _formatter(config_file, podnet_node, podnet_node == enabled, successful_payloads)
         if ret["channel_code"] != CHANNEL_SUCCESS:
-            retval = False
             fmt.store_channel_error(ret, f"{prefix+1} : " + messages[prefix+1])
         if ret["payload_code"] != SUCCESS_CODE:
-            retval = False
             fmt.store_payload_error(ret, f"{prefix+2} : " + messages[prefix+2])
-        else:
-            data_dict[podnet_node]['entry'] = ret["payload_message"].strip()
-            fmt.add_successful('find_path', ret)
 
-        return retval, fmt.message_list, fmt.successful_payloads, data_dict
+        return False, fmt.message_list, fmt.successful_payloads, data_dict
+
+    successful_payloads = {}
+    # Keyed up front so the result lists the enabled node first regardless of which node finishes first
+    data_dict = {enabled: {}, disabled: {}}
+    (retval_enabled, msg_list_enabled, _, _), (retval_disabled, msg_list_disabled, _, _) = run_podnets(
+        run_podnet,
+        (enabled, 3220, successful_payloads, data_dict),
+        (disabled, 3230, successful_payloads, data_dict),
+    )
+
+    msg_list = list()
+    msg_list.extend(msg_list_enabled)
+    if disabled != enabled:
+        msg_list.extend(msg_list_disabled)
+
+    if not (retval_enabled and retval_disabled):
+        return False, data_dict, msg_list
+    else:
+       return True, data_dict, (messages[1200].format(path=path))
+
+
+@with_pod_config(returns_data=True)
+def read_many(
+        paths: List[str],
+        config_file=None,
+        entry_format: str = 'stat',
+        *,
+        enabled: str,
+        disabled: str,
+) -> Tuple[bool, Dict[str, Any], List[str]]:
+    """
+    description:
+        Gets the status of several directories on PodNet HA, using a single payload per PodNet node rather than
+        one read() per directory.
+
+    parameters:
+        paths:
+            description: The paths to be read on the PodNet
+            type: array
+            items:
+                type: string
+            required: true
+        config_file:
+            description: The path to the config.json file
+            type: string
+            required: false
+        entry_format:
+            description: |
+                'stat' for the full output of `stat <path>`, 'fields' for a dict of the path's name, type, size,
+                mtime and mode parsed from a single line, which is cheaper to transfer and to consume.
+            type: string
+            required: false
+    return:
+        description: |
+            A list with 3 items: (1) a boolean status flag indicating if the
+            read was successfull, (2) a dict containing the data as read from
+            the both machines' current state and (3) the output or success message.
+        type: tuple
+        items:
+          read:
+            description: True if all read operations were successful, False otherwise.
+            type: boolean
+          data:
+            type: object
+            description: |
+              stat output retrieved from both podnet nodes. May be None if nothing
+              could be retrieved.
+            properties:
+              <podnet_ip>:
+                description: The output from the command "stat <path>", or its fields as described for
+                  entry_format, keyed by path. Paths that could not be read are left out.
+        message_list:
+            description: A list of comma seperated messages recording any errors encountered during the request.
+            type: array
 
-    retval_enabled, msg_list_enabled, successful_payloads, data_dict = run_podnet(enabled, 3220, {}, {})
+    """
+    messages = READ_MANY_MESSAGES
+
+    if entry_format not in ('stat', 'fields'):
+        return False, None, '3201: ' + messages[3201].format(entry_format=entry_format)
+
+    # define payloads, built once for both nodes with the paths quoted for the shell. All the stats go out as one
+    # sectioned_payload(), each section named by its path's index in paths.
+    payloads = {
+        'find_paths': sectioned_payload({
+            str(i): _stat_payload(path, entry_format) for i, path in enumerate(paths)
+        }),
+    }
+
+    def run_podnet(podnet_node, prefix, successful_payloads, data_dict):
+        data_dict[podnet_node] = {}
 
-    retval_disabled, msg_list_disabled, successful_payloads, data_dict = run_podnet(disabled, 3230, successful_payloads, data_dict)
+        # The node's shared persistent connection, opened by the first primitive to reach it
+        rcc = get_ssh_session(podnet_node, 'robot')
+
+        ret = rcc.run(payloads['find_paths'])
+        if ret["channel_code"] != CHANNEL_SUCCESS:
+            fmt = _formatter(config_file, podnet_node, podnet_node == enabled, successful_payloads)
+            fmt.store_channel_error(ret, f"{prefix+1} : " + messages[prefix+1])
+            return False, fmt.message_list, fmt.successful_payloads, data_dict
+
+        fmt = None
+        sections = split_sections(ret["payload_message"])
+        for i, path in enumerate(paths):
+            section_ret = dict(ret)
+            section_ret["payload_code"], section_ret["payload_message"] = sections.get(str(i), (None, ''))
+            if section_ret["payload_code"] == SUCCESS_CODE:
+                entry = section_ret["payload_message"].strip()
+                if entry_format == 'fields':
+                    entry = _parse_stat_fields(entry)
+                data_dict[podnet_node][path] = entry
+                PodnetErrorFormatter.record_successful(successful_payloads, podnet_node, 'find_paths', section_ret)
+                continue
+            if fmt is None:
+                fmt = _formatter(config_file, podnet_node, podnet_node == enabled, successful_payloads)
+            fmt.store_payload_error(section_ret, f"{prefix+2} : " + messages[prefix+2].format(path=path))
+
+        if fmt is None:
+            return True, [], successful_payloads, data_dict
+        return False, fmt.message_list, fmt.successful_payloads, data_dict
+
+    successful_payloads = {}
+    # Keyed up front so the result lists the enabled node first regardless of which node finishes first
+    data_dict = {enabled: {}, disabled: {}}
+    (retval_enabled, msg_list_enabled, _, _), (retval_disabled, msg_list_disabled, _, _) = run_podnets(
+        run_podnet,
+        (enabled, 3240, successful_payloads, data_dict),
+        (disabled, 3250, successful_payloads, data_dict),
+    )
 
     msg_list = list()
     msg_list.extend(msg_list_enabled)
-    msg_list.extend(msg_list_disabled)
+    if disabled != enabled:
+        msg_list.extend(msg_list_disabled)
 
     if not (retval_enabled and retval_disabled):
         return False, data_dict, msg_list
     else:
-       return True, data_dict, (messages[1200])
+       return True, data_dict, (messages[1201].format(count=len(paths)))
 
 
-def scrub(path: str, config_file=None) -> Tuple[bool, str]:
+@with_pod_config
+def scrub(
+        path: str,
+        config_file=None,
+        *,
+        enabled: str,
+        disabled: str,
+) -> Tuple[bool, str]:
     """
     description:
         Removes directory on PodNet HA.
@@ -223,63 +429,26 @@ def scrub(path: str, config_file=None) -> Tuple[bool, str]:
             the output or error message.
         type: tuple
     """
-    # Define message
-    messages = {
-        1000: f'Successfully removed directory {path}',
-        3121: f'Failed to connect to the enabled PodNet node for delete_path payload: ',
-        3122: f'Failed to run delete_path payload on the enabled PodNet. Payload exited with status ',
-
-        3131: f'Failed to connect to the disabled PodNet node for delete_path payload: ',
-        3132: f'Failed to run delete_path payload on the disabled PodNet. Payload exited with status ',
-    }
-
-    # Default config_file if it is None
-    if config_file is None:
-        config_file = '/opt/robot/config.json'
-
-
-    status, config_data, msg = load_pod_config(config_file)
-    if not status:
-      if config_data['raw'] is None:
-          return False, msg
-      else:
-          return False, msg + "\nJSON dump of raw configuration:\n" + json.dumps(config_data['raw'],
-              indent=2,
-              sort_keys=True)
-    enabled = config_data['processed']['enabled']
-    disabled = config_data['processed']['disabled']
-
-    def run_podnet(podnet_node, prefix, successful_payloads):
-        rcc = SSHCommsWrapper(comms_ssh, podnet_node, 'robot')
-        fmt = PodnetErrorFormatter(
-            config_file,
-            podnet_node,
-            podnet_node == enabled,
-            {'payload_message': 'STDOUT', 'payload_error': 'STDERR'},
-            successful_payloads
-        )
-
-        payloads = {
-            'delete_directory':     f'rm --recursive --force {path}'
-        }
-
-        ret = rcc.run(payloads['delete_directory'])
-
-        if ret["channel_code"] != CHANNEL_SUCCESS:
-            return False, fmt.channel_error(ret, f"{prefix+1}: " + messages[prefix+1]), fmt.successful_payloads
-        if ret["payload_code"] != SUCCESS_CODE:
-            return False, fmt.payload_error(ret, f"{prefix+2}: " + messages[prefix+2]), fmt.successful_payloads
-        fmt.add_successful('delete_directory', ret)
-
-        return True, "", fmt.successful_payloads
-
-    status, msg, successful_payloads = run_podnet(enabled, 3120, {})
-    if status == False:
-        return status, msg
-
-    status, msg, successful_payloads = run_podnet(disabled, 3130, successful_payloads)
-    if status == False:
-        return status, msg
-
-    return True, messages[1000]
+    messages = SCRUB_MESSAGES
+
+    run_podnet = partial(
+        _run_payload,
+        name='delete_directory',
+        payload=DELETE_PATH_PAYLOAD.format(path=shlex.quote(path)),
+        messages=messages,
+        config_file=config_file,
+        enabled=enabled,
+    )
+
+    successful_payloads = {}
+    results = run_podnets(
+        run_podnet,
+        (enabled, 3120, successful_payloads),
+        (disabled, 3130, successful_payloads),
+    )
+    for status, msg, _ in results:
+        if status == False:
+            return status, msg
+
+    return True, messages[1000].format(path=path)
 
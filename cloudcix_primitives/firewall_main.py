@@ -2,8 +2,10 @@
 Primitive of Nftable based Main Firewall for PodNet
 """
 # stdlib
+import hashlib
 import logging
-from collections import deque
+from collections import Counter, deque
+from functools import lru_cache
 from typing import Tuple
 # lib
 from cloudcix.rcc import deploy_lsh, CouldNotExecuteException
@@ -17,52 +19,143 @@ __all__ = [
 ]
 
 BUILD_TEMPLATE = 'firewall_main/commands/build.sh.j2'
+# Loaded and compiled once at import rather than looked up through the loader on every build()
+BUILD_SCRIPT_TEMPLATE = JINJA_ENV.get_template(BUILD_TEMPLATE)
 LOGGER = 'primitives.firewall_main'
 
 
-def complete_rule(rule, iiface, oiface, log_setup):
-    v = '' if rule['version'] == '4' else '6'
+# Protocols handled by jumping to one of the application chains in nftables.conf.j2, formatted with the IP version
+# suffix as {v} and the rule's action as {action}
+PROTOCOL_JUMPS = {
+    'icmp': 'jump icmp{v}_{action}',
+    'dns': 'jump dns_{action}',
+    'vpn': 'jump vpn_{action}',
+}
 
-    # input interface line
-    iif = f'iifname {iiface}' if iiface not in [None, 'any'] else ''
 
-    # output interface line
-    oif = f'oifname {oiface}' if oiface not in [None, 'any'] else ''
+def _frozen_rule(rule):
+    """
+    Returns a hashable copy of rule to cache its validation under, with its lists as tuples and each value tagged
+    with its type, so values the validator treats differently, such as a list and a tuple, do not share a key.
+    Returns None if some value cannot be hashed.
+    """
+    frozen = tuple(
+        (key, list, tuple(value)) if isinstance(value, list) else (key, type(value), value)
+        for key, value in sorted(rule.items(), key=lambda item: str(item[0]))
+    )
+    try:
+        hash(frozen)
+    except TypeError:
+        return None
+    return frozen
 
-    # sort the `destination` rule format
-    if rule['destination'] is None or 'any' in rule['destination']:
-        daddr = ''
-    else:
-        daddr = f'ip{v} daddr ' + '{' + ','.join(rule['destination']) + '}'
 
-    # sort the `source` rule format
-    if rule['source'] is None or 'any' in rule['source']:
-        saddr = ''
-    else:
-        saddr = f'ip{v} saddr ' + '{' + ','.join(rule['source']) + '}'
+@lru_cache(maxsize=4096)
+def _validate_frozen_rule(frozen):
+    """
+    Validates the rule frozen by _frozen_rule(). Many PodNets repeat the same rules, so each distinct rule is only
+    checked once per process, the LRU bound keeping the cache from growing with every rule ever seen.
+    """
+    rule = {key: list(value) if kind is list else value for key, kind, value in frozen}
+    success, errors = FirewallPodNet(rule)()
+    return success, tuple(errors)
 
-    # sort the `port` rule format
-    if rule['port'] is None or rule['protocol'] == 'any':
-        dport = ''
-    else:
-        dport = 'dport ' + '{' + ','.join(rule['port']) + '}'
 
-    # rule protocol and port statement
-    if rule['protocol'] == 'any':
-        proto_port = f'{rule["action"]}'
-    elif rule['protocol'] == 'icmp':
-        proto_port = f'jump icmp{v}_{rule["action"]}'
-    elif rule['protocol'] == 'dns':
-        proto_port = f'jump dns_{rule["action"]}'
-    elif rule['protocol'] == 'vpn':
-        proto_port = f'jump vpn_{rule["action"]}'
-    else:
-        proto_port = f'{rule["protocol"]} {dport} {rule["action"]}'
+def _validate_rule(rule):
+    """
+    Returns the (success, errors) result of validating rule with FirewallPodNet, from the cache if possible.
+    """
+    frozen = _frozen_rule(rule)
+    if frozen is None:
+        return FirewallPodNet(rule)()
+    return _validate_frozen_rule(frozen)
+
+
+def _address_keys(rule):
+    """
+    Returns the _address_key()s of rule's source and destination lists, computed once per rule in build() and
+    shared by _address_sets() and complete_rule().
+    """
+    return _address_key(rule, 'source'), _address_key(rule, 'destination')
+
+
+def _address_key(rule, field):
+    """
+    Returns the canonical (IP version suffix, sorted addresses) key of a rule's source or destination list, or None
+    if the rule does not restrict that field.
+    """
+    addresses = rule[field]
+    if addresses is None or 'any' in addresses:
+        return None
+    return '' if rule['version'] == '4' else '6', tuple(sorted(addresses))
+
+
+def _address_sets(rule_address_keys):
+    """
+    Finds the source and destination lists of more than one address that several rules repeat, given each rule's
+    _address_keys(), and returns a dict mapping their _address_key() to the name of a named set holding them, so
+    the table defines each list once and its rules look it up with a single hash probe instead of each carrying its
+    own anonymous set.
+    """
+    counts = Counter(
+        key
+        for address_keys in rule_address_keys
+        for key in address_keys
+        if key is not None and len(key[1]) > 1
+    )
+    return {
+        key: 'auto_' + hashlib.sha1(f'{key[0]}|{",".join(key[1])}'.encode()).hexdigest()[:12]
+        for key, count in counts.items() if count > 1
+    }
+
+
+def complete_rule(rule, iiface, oiface, log_setup, named_sets=None, address_keys=None):
+    """
+    Returns the nft statement for rule. Source and destination lists found in named_sets, as returned by
+    _address_sets(), reference that named set instead of listing their addresses. address_keys are the rule's
+    _address_keys(), if the caller already has them.
+    """
+    v = '' if rule['version'] == '4' else '6'
+    named_sets = {} if named_sets is None else named_sets
+    if address_keys is None:
+        address_keys = _address_keys(rule)
+    protocol = rule['protocol']
+    action = rule['action']
+
+    # Only the statements a rule actually has are collected, in nft order, and joined once
+    parts = []
+
+    # input and output interface
+    if iiface not in (None, 'any'):
+        parts.append(f'iifname {iiface}')
+    if oiface not in (None, 'any'):
+        parts.append(f'oifname {oiface}')
+
+    # source and destination addresses
+    for (field, selector), key in zip((('source', 'saddr'), ('destination', 'daddr')), address_keys):
+        if key is None:
+            continue
+        if key in named_sets:
+            parts.append(f'ip{v} {selector} @{named_sets[key]}')
+        else:
+            parts.append(f'ip{v} {selector} {{{",".join(rule[field])}}}')
 
     # log
-    log = f'log prefix "{str(log_setup["prefix"])}" group {str(log_setup["group"])}' if rule['log'] is True else ''
+    if rule['log'] is True:
+        parts.append(f'log prefix "{log_setup["prefix"]}" group {log_setup["group"]}')
 
-    return f'{iif} {oif} {saddr} {daddr} {log} {proto_port}'
+    # rule protocol and port statement
+    if protocol == 'any':
+        parts.append(action)
+    elif protocol in PROTOCOL_JUMPS:
+        parts.append(PROTOCOL_JUMPS[protocol].format(v=v, action=action))
+    else:
+        parts.append(protocol)
+        if rule['port'] is not None:
+            parts.append(f'dport {{{",".join(rule["port"])}}}')
+        parts.append(action)
+
+    return ' '.join(parts)
 
 
 def build(
@@ -82,8 +175,8 @@ def build(
                 containing firewall rules in the following format
                 rule = {
                     'version': '4',
-                    'source': [],
-                    'destination': [],
+                    'source': ['any'],
+                    'destination': ['91.103.0.0/24', '91.103.3.0/24'],
                     'protocol': 'tcp',
                     'port': ['22'],
                     'action': 'accept',
@@ -98,10 +191,14 @@ def build(
                     description: version of IP ie 4 or 6
                     type: string
                 source:
-                    description: list of source ipaddresses (all must be either private or public but not mixed)
+                    description: |
+                        non empty list of source ipaddresses (all must be either private or public but not mixed),
+                        or ['any']
                     type: list of strings
                 destination:
-                    description: list of destination ipaddresses (all must be either private or public but not mixed)
+                    description: |
+                        non empty list of destination ipaddresses (all must be either private or public but not
+                        mixed), or ['any']
                     type: list of strings
                 protocol:
                     description: name of the protocol, e.g `tcp`, `udp`, `icmp` or `any`
@@ -171,8 +268,7 @@ def build(
     # validate the rules
     proceed, errors = True, []
     for rule in firewall_rules:
-        validated = FirewallPodNet(rule)
-        success, errs = validated()
+        success, errs = _validate_rule(rule)
         if success is False:
             proceed = False
             errors.extend(errs)
@@ -184,20 +280,37 @@ def build(
     inbound_rules = deque()
     outbound_rules = deque()
     forward_rules = deque()
-    for rule in sorted(firewall_rules, key=lambda fw: fw['order']):
+    # each rule's address lists are scanned for `any` and canonicalised once, up front
+    rules = sorted(firewall_rules, key=lambda fw: fw['order'])
+    rule_address_keys = [_address_keys(rule) for rule in rules]
+    named_sets = _address_sets(rule_address_keys)
+    for rule, address_keys in zip(rules, rule_address_keys):
         # sort traffic direction ie inbound, outbound and forward
         iiface = rule['iiface'] if rule['iiface'] not in [None, '', 'none'] else None
         oiface = rule['oiface'] if rule['oiface'] not in [None, '', 'none'] else None
         if iiface is not None and oiface is None:
-            inbound_rules.append(complete_rule(rule, iiface, None, log_setup))
+            inbound_rules.append(complete_rule(rule, iiface, None, log_setup, named_sets, address_keys))
         elif iiface is None and oiface is not None:
-            outbound_rules.append(complete_rule(rule, None, oiface, log_setup))
+            outbound_rules.append(complete_rule(rule, None, oiface, log_setup, named_sets, address_keys))
         elif iiface is not None and oiface is not None:
-            forward_rules.append(complete_rule(rule, iiface, oiface, log_setup))
+            forward_rules.append(complete_rule(rule, iiface, oiface, log_setup, named_sets, address_keys))
+
+    # A rule rendering the same as an earlier one in its chain is redundant, any packet reaching it has already had
+    # the same statement applied, so only the first of each is kept. dict.fromkeys() keeps the rule order.
+    inbound_rules = deque(dict.fromkeys(inbound_rules))
+    outbound_rules = deque(dict.fromkeys(outbound_rules))
+    forward_rules = deque(dict.fromkeys(forward_rules))
+
+    # named set definitions, their elements joined here rather than looped over in the template
+    sets = [
+        {'name': name, 'type': f'ipv{6 if v else 4}_addr', 'elements': ', '.join(addresses)}
+        for (v, addresses), name in named_sets.items()
+    ]
 
     # template data
     template_data = {
         'log_setup': log_setup,
+        'sets': sets,
         'inbound_rules': inbound_rules,
         'forward_rules': forward_rules,
         'outbound_rules': outbound_rules,
@@ -205,7 +318,7 @@ def build(
     }
 
     # ensure all the required keys are collected and no key has None value for template_data
-    template = JINJA_ENV.get_template(BUILD_TEMPLATE)
+    template = BUILD_SCRIPT_TEMPLATE
     template_verified, template_error = check_template_data(template_data, template)
     if not template_verified:
         logger.debug(f'Failed to generate PodNet Firewall build template. {template_error}')
@@ -1,32 +1,98 @@
 # stdlib
+import atexit
+import inspect
 import ipaddress
 import json
 import os
+import select
+import socket
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from functools import lru_cache, partial, wraps
 from pathlib import Path
 from typing import Any, Dict, Optional, Tuple
 # libs
+from cloudcix.rcc import CHANNEL_SUCCESS, CONNECTION_ERROR, RESPONSE_DICT, VALIDATION_ERROR
 from jinja2 import Environment, FileSystemLoader, meta, Template
+from paramiko import AutoAddPolicy, SSHClient, SSHException
 # local
 
 
 __all__ = [
     'check_template_data',
+    'close_ssh_sessions',
+    'comms_ssh_tuned',
+    'get_ssh_session',
     'hyperv_dictify',
     'load_pod_config',
+    'run_podnets',
+    'run_steps',
+    'sectioned_payload',
+    'split_sections',
+    'with_pod_config',
     'HostErrorFormatter',
     'JINJA_ENV',
     'LXDCommsWrapper',
+    'OpenSSHCommsWrapper',
+    'PersistentSSHCommsWrapper',
     'PodnetErrorFormatter',
+    'SECTION_MARKER',
     'SSHCommsWrapper',
+    'STATUS_MARKER',
 ]
 
 primitives_directory = os.path.dirname(os.path.abspath(__file__))
 
+# The templates ship with the package and do not change while the process runs, so the environment does not stat
+# them for changes on every lookup, including the includes resolved while rendering
 JINJA_ENV = Environment(
+    auto_reload=False,
     loader=FileSystemLoader(f'{primitives_directory}/templates'),
     trim_blocks=True,
 )
 
+# CBC mode and 3DES ciphers are slow and cannot be pipelined, leaving paramiko to pick an AES-CTR/GCM cipher
+# (AES-NI accelerated) instead. paramiko does not implement chacha20-poly1305.
+SSH_DISABLED_ALGORITHMS = {
+    'ciphers': ['3des-cbc', 'aes128-cbc', 'aes192-cbc', 'aes256-cbc'],
+}
+
+# Bytes _exec_paramiko() reads from a channel at a time, and the longest it waits for more output before checking
+# the channel's state again
+SSH_READ_SIZE = 32768
+SSH_POLL_INTERVAL = 1
+
+# Seconds a session handed out by get_ssh_session() may sit unused before the next get_ssh_session() call closes it,
+# the in-process equivalent of OpenSSH's ControlPersist
+SSH_SESSION_IDLE_TIMEOUT = 600
+
+# Seconds OpenSSHCommsWrapper.run() waits for the ssh client to finish a payload before giving up on it
+SSH_COMMAND_TIMEOUT = 300
+
+# If set, get_ssh_session() hands out OpenSSHCommsWrapper sessions whose OpenSSH ControlMaster sockets are kept in
+# the directory this environment variable names, shared with later processes
+SSH_CONTROL_DIR_ENV = 'CLOUDCIX_SSH_CONTROL_DIR'
+
+# If set, _pod_config_error() dumps the raw configuration indented and with sorted keys rather than compact
+VERBOSE_CONFIG_DUMP_ENV = 'CLOUDCIX_VERBOSE_CONFIG_DUMP'
+
+# A payload combined by sectioned_payload() has its output preceded by a SECTION_MARKER line naming it and
+# followed by a STATUS_MARKER line carrying its exit status
+SECTION_MARKER = '@@cloudcix-section@@ '
+STATUS_MARKER = '@@cloudcix-status@@ '
+
+# Exit status of a payload that succeeded
+SUCCESS_CODE = 0
+
+# (host_ip, username) -> PersistentSSHCommsWrapper or OpenSSHCommsWrapper, see get_ssh_session()
+_SSH_SESSIONS = {}
+_SSH_SESSIONS_LOCK = threading.Lock()
+# (raw config, verbose flag, its JSON dump) last formatted by _pod_config_error()
+_RAW_CONFIG_DUMP = (None, False, '')
+
 
 def check_template_data(template_data: Dict[str, Any], template: Template) -> Tuple[bool, str]:
     """
@@ -35,13 +101,8 @@ def check_template_data(template_data: Dict[str, Any], template: Template) -> Tu
     :param template: The template to be verified
     :return: tuple of boolean flag, success and the error string if any
     """
-    with open(str(template.filename), 'r') as fp:
-        template_source = fp.read()
-
-    parsed = JINJA_ENV.parse(source=template_source)
-    required_keys = meta.find_undeclared_variables(parsed)
     err = ''
-    for k in required_keys:
+    for k in _template_variables(str(template.filename)):
         if k not in template_data:
             err += f'Key `{k}` not found in template data.\n'
 
@@ -49,6 +110,175 @@ def check_template_data(template_data: Dict[str, Any], template: Template) -> Tu
     return success, err
 
 
+@lru_cache(maxsize=64)
+def _template_variables(filename):
+    """
+    Returns the variables the template in filename expects to be passed in. Templates do not change while the
+    process runs, so each one is read and parsed once.
+    """
+    with open(filename, 'r') as fp:
+        template_source = fp.read()
+    return frozenset(meta.find_undeclared_variables(JINJA_ENV.parse(source=template_source)))
+
+
+def comms_ssh_tuned(host_ip: str, payload: str, username: str = 'administrator', timeout: int = 4) -> Dict[str, Any]:
+    """
+    Drop-in replacement for cloudcix.rcc.comms_ssh() tuned for the short, latency bound commands primitives run:
+    Nagle's algorithm is disabled on the socket, compression is off and slow CBC/3DES ciphers are never
+    negotiated. Takes the same parameters and returns the same response dict as comms_ssh().
+
+    :param host_ip: The IP address where the command should be run
+    :param payload: The shell commands to run on the remote host
+    :param username: The user that will run the commands on the remote host
+    :param timeout: How long the client can attempt to connect to the remote host
+    :return: RCC response dict with channel_code, channel_message, channel_error, payload_code, payload_message
+        and payload_error keys
+    """
+    response = deepcopy(RESPONSE_DICT)
+
+    try:
+        ip = ipaddress.ip_address(host_ip)
+    except ValueError as e:
+        response['channel_code'] = VALIDATION_ERROR
+        response['channel_message'] = f'Could not parse sent `host_ip` value {host_ip}'
+        response['channel_error'] = str(e)
+        return response
+
+    client, err = _get_tuned_client(ip, username, timeout)
+    if err is not None:
+        response['channel_code'] = CONNECTION_ERROR
+        response['channel_message'] = f'Could not establish a SSH connection to {host_ip} for username {username}.'
+        response['channel_error'] = err
+        return response
+
+    response['channel_code'] = CHANNEL_SUCCESS
+    response['channel_message'] = f'Connection established to IP {host_ip}'
+
+    exit_code, out, err = _exec_paramiko(client, payload)
+    client.close()
+
+    response['payload_code'] = exit_code
+    response['payload_message'] = out
+    response['payload_error'] = err
+
+    return response
+
+
+def _exec_paramiko(client, payload):
+    """
+    Runs payload on a new channel of the connected paramiko.SSHClient client. stdout and stderr are both read as
+    their output arrives, so a payload writing a lot to either one does not stall on a full channel window.
+    :param client: A connected paramiko.SSHClient
+    :param payload: The command(s) to run on the host
+    :return: tuple of the payload's exit status, stdout and stderr
+    """
+    channel = client.get_transport().open_session()
+    try:
+        channel.exec_command(payload)
+        out = []
+        err = []
+        while True:
+            # Checked before draining, so output arriving together with the EOF is read by the drain below
+            finished = channel.eof_received or channel.closed
+            while channel.recv_ready():
+                out.append(channel.recv(SSH_READ_SIZE))
+            while channel.recv_stderr_ready():
+                err.append(channel.recv_stderr(SSH_READ_SIZE))
+            if finished:
+                break
+            select.select([channel], [], [], SSH_POLL_INTERVAL)
+        exit_code = channel.recv_exit_status()
+    finally:
+        channel.close()
+    return exit_code, b''.join(out).decode(), b''.join(err).decode()
+
+
+def _get_tuned_client(ip, username, timeout):
+    """
+    Obtain a paramiko.SSHClient connected to the given `ip` with the settings described in comms_ssh_tuned().
+    :param ip: An IPAddress to connect to
+    :param username: The remote user to login as
+    :param timeout: How long the client can attempt to connect to the remote host
+    :return: tuple of the connected client (None on failure) and the error string if any
+    """
+    client = SSHClient()
+    client.set_missing_host_key_policy(AutoAddPolicy())
+    sock = None
+    try:
+        sock = socket.socket(socket.AF_INET6 if ip.version == 6 else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(timeout)
+        sock.connect((str(ip), 22))
+        client.connect(
+            hostname=str(ip),
+            username=username,
+            timeout=timeout,
+            sock=sock,
+            compress=False,
+            disabled_algorithms=SSH_DISABLED_ALGORITHMS,
+        )
+    except (SSHException, OSError) as e:
+        err = str(e)
+    except Exception as e:
+        err = f'An unknown exception occurred: {e}'
+    else:
+        return client, None
+
+    # PersistentSSHCommsWrapper retries on every run(), so a failed attempt must not leave its socket open
+    client.close()
+    if sock is not None:
+        sock.close()
+    return None, err
+
+
+def close_ssh_sessions():
+    """
+    Closes and forgets all sessions handed out by get_ssh_session().
+    """
+    with _SSH_SESSIONS_LOCK:
+        sessions = list(_SSH_SESSIONS.values())
+        _SSH_SESSIONS.clear()
+    for session in sessions:
+        session.close()
+
+
+# Close the shared sessions cleanly at exit rather than leaving their transports to the interpreter's teardown
+atexit.register(close_ssh_sessions)
+
+
+def get_ssh_session(host_ip: str, username: str):
+    """
+    Returns the process wide PersistentSSHCommsWrapper for host_ip and username, creating it on first use. The
+    connection stays open after the caller is done, so consecutive primitives (or build() followed by scrub())
+    targeting the same host only authenticate once. Callers must not close() the returned session. Sessions left
+    unused for longer than SSH_SESSION_IDLE_TIMEOUT seconds are closed and forgotten on the next call.
+
+    If the CLOUDCIX_SSH_CONTROL_DIR environment variable is set, the session is an OpenSSHCommsWrapper instead,
+    which shares its connection with other processes as well. The ssh client exits with status 255 both for its
+    own errors and when the remote command does, so with such a session a payload exiting 255 is reported as a
+    connection error.
+
+    :param host_ip: Target Host for the payloads
+    :param username: User name to log in as
+    """
+    key = (host_ip, username)
+    idle_since = time.monotonic() - SSH_SESSION_IDLE_TIMEOUT
+    with _SSH_SESSIONS_LOCK:
+        idle = [k for k, s in _SSH_SESSIONS.items() if k != key and s.last_used < idle_since]
+        idle_sessions = [_SSH_SESSIONS.pop(k) for k in idle]
+        session = _SSH_SESSIONS.get(key)
+        if session is None:
+            control_dir = os.environ.get(SSH_CONTROL_DIR_ENV)
+            if control_dir:
+                session = OpenSSHCommsWrapper(host_ip, username, control_dir)
+            else:
+                session = PersistentSSHCommsWrapper(host_ip, username)
+            _SSH_SESSIONS[key] = session
+    for idle_session in idle_sessions:
+        idle_session.close()
+    return session
+
+
 def hyperv_dictify(data):
     lines = data.strip().split('\r\n')
     # Splitting both lines by whitespace
@@ -59,6 +289,16 @@ def hyperv_dictify(data):
     return data_dict
 
 
+@lru_cache(maxsize=8)
+def _read_pod_config(config_file, mtime_ns, size):
+    """
+    Parses config_file. The modification time and size are only part of the cache key, so an edited file is
+    read again. The returned object is shared between callers and must not be modified.
+    """
+    with Path(config_file).open('r') as file:
+        return json.load(file)
+
+
 def load_pod_config(config_file=None, prefix=4000) -> Tuple[bool, Dict[str, Optional[Any]], str]:
     """
     Checks for pod config.json from supplied config_file loads into a json
@@ -90,10 +330,10 @@ def load_pod_config(config_file=None, prefix=4000) -> Tuple[bool, Dict[str, Opti
 
     config = None
 
-    # Load config from config_file
+    # Load config from config_file, re-reading it only when it changed since the last call
     try:
-        with Path(config_file).open('r') as file:
-            config = json.load(file)
+        stat = os.stat(config_file)
+        config = _read_pod_config(config_file, stat.st_mtime_ns, stat.st_size)
     except OSError as e:
         return False, config_data, f'{prefix + 11}: {messages[11]} {e.__str__()}'
     except Exception as e:
@@ -145,6 +385,139 @@ def load_pod_config(config_file=None, prefix=4000) -> Tuple[bool, Dict[str, Opti
 
     return True, config_data, f'{prefix + 10}: {messages[10]}'
 
+
+def _pod_config_error(config_data, msg):
+    """
+    Formats the message for a failed load_pod_config(), including a dump of the raw configuration if the file
+    could at least be parsed. _read_pod_config() hands out the same object until the file changes, so the last
+    dump is kept and reused while the raw configuration is that same object. The dump is a diagnostic, so it is
+    compact unless the CLOUDCIX_VERBOSE_CONFIG_DUMP environment variable asks for the slower sorted and indented
+    form.
+    """
+    global _RAW_CONFIG_DUMP
+    raw = config_data['raw']
+    if raw is None:
+        return msg
+    verbose = bool(os.environ.get(VERBOSE_CONFIG_DUMP_ENV))
+    dumped_raw, dumped_verbose, dump = _RAW_CONFIG_DUMP
+    if dumped_raw is not raw or dumped_verbose != verbose:
+        if verbose:
+            dump = json.dumps(raw, indent=2, sort_keys=True)
+        else:
+            dump = json.dumps(raw)
+        _RAW_CONFIG_DUMP = (raw, verbose, dump)
+    return msg + "\nJSON dump of raw configuration:\n" + dump
+
+
+def run_podnets(run_podnet, *node_args):
+    """
+    Calls run_podnet(*args) for each tuple in node_args concurrently and returns the results in the same order.
+    The first item of each tuple is the PodNet node to run on. The nodes are independent SSH targets, so this
+    takes as long as the slowest node rather than the sum of all of them. Shared successful_payloads and data_dict
+    arguments are safe, each node only writes its own key. A node listed more than once, as the enabled and
+    disabled node of a single node deployment, is only run for its first entry and that result is returned for
+    all of them.
+    """
+    first_args = {}
+    for args in node_args:
+        first_args.setdefault(args[0], args)
+    with ThreadPoolExecutor(max_workers=len(first_args)) as executor:
+        runs = {node: executor.submit(run_podnet, *args) for node, args in first_args.items()}
+        return [runs[args[0]].result() for args in node_args]
+
+
+def run_steps(rcc, fmt, payloads, steps, prefix, messages):
+    """
+    Runs the payloads named in steps, a sequence of (payload name, message offset) tuples, in order over rcc,
+    stopping at the first failure. A payload's channel error message is messages[prefix + offset], its payload
+    error message messages[prefix + offset + 1].
+    :param rcc: object to run the payloads with, such as a PersistentSSHCommsWrapper
+    :param fmt: PodnetErrorFormatter for the node, recording the successful payloads
+    :param payloads: dict mapping payload names to payloads
+    :param steps: the (payload name, message offset) tuples of the payloads to run
+    :param prefix: the node's base error code
+    :param messages: error messages indexed by error code
+    :return: tuple of a boolean success flag and the formatted error message, if any
+    """
+    for name, offset in steps:
+        ret = rcc.run(payloads[name])
+        if ret['channel_code'] != CHANNEL_SUCCESS:
+            return False, fmt.channel_error(ret, f'{prefix + offset}: ' + messages[prefix + offset])
+        if ret['payload_code'] != SUCCESS_CODE:
+            return False, fmt.payload_error(ret, f'{prefix + offset + 1}: ' + messages[prefix + offset + 1])
+        fmt.add_successful(name, ret)
+    return True, ''
+
+
+def sectioned_payload(payloads):
+    """
+    Combines the payloads dict, mapping names to payloads, into a single payload that runs each of them in turn,
+    whatever their exit status, and delimits their output for split_sections(). Names must not contain newlines.
+    """
+    return "\n".join(
+        f'echo "{SECTION_MARKER}{name}"; {payload}; status=$?; echo; echo "{STATUS_MARKER}$status"'
+        for name, payload in payloads.items()
+    )
+
+
+def split_sections(output):
+    """
+    Splits the output of a sectioned_payload() into a dict mapping each payload's name to a tuple of its exit
+    status (None if it could not be determined) and its output.
+    """
+    sections = {}
+    for section in output.split(SECTION_MARKER)[1:]:
+        name, _, rest = section.partition('\n')
+        body, _, status = rest.rpartition(STATUS_MARKER)
+        try:
+            code = int(status)
+        except ValueError:
+            code = None
+        sections[name] = (code, body)
+    return sections
+
+
+def with_pod_config(fn=None, *, returns_data=False):
+    """
+    Decorator for PodNet primitives that take a `config_file` argument. Loads the pod config before calling fn
+    and returns (False, error message) without calling it if that fails, or (False, None, error message) when
+    used as @with_pod_config(returns_data=True) on a read() style function. config_file defaults to
+    /opt/robot/config.json. fn is called with the resolved config_file and the keyword only arguments `enabled`
+    and `disabled`, holding the enabled and disabled PodNet nodes. The decorated function does not expose those
+    two arguments.
+    """
+    if fn is None:
+        return partial(with_pod_config, returns_data=returns_data)
+
+    signature = inspect.signature(fn)
+    public_signature = signature.replace(parameters=[
+        param for name, param in signature.parameters.items() if name not in ('enabled', 'disabled')
+    ])
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        bound = public_signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        if bound.arguments['config_file'] is None:
+            bound.arguments['config_file'] = '/opt/robot/config.json'
+
+        status, config_data, msg = load_pod_config(bound.arguments['config_file'])
+        if not status:
+            if returns_data:
+                return False, None, _pod_config_error(config_data, msg)
+            return False, _pod_config_error(config_data, msg)
+
+        return fn(
+            *bound.args,
+            enabled=config_data['processed']['enabled'],
+            disabled=config_data['processed']['disabled'],
+            **bound.kwargs,
+        )
+
+    wrapper.__signature__ = public_signature
+    return wrapper
+
+
 def write_rule(namespace: str, rule: Dict[str, Optional[Any]], user_chain: str) -> str:
     """
     Builds an ip/ip6 command string to write a rule to the provided chain.
@@ -294,6 +667,212 @@ class LXDCommsWrapper:
         )
 
 
+class OpenSSHCommsWrapper:
+    """
+    Runs payloads through the OpenSSH client over a ControlMaster connection whose socket lives in control_dir.
+    The first run() starts the master, which outlives this process for control_persist seconds, so later
+    processes running primitives against the same host skip the TCP handshake, key exchange and authentication
+    too. Has the same interface as PersistentSSHCommsWrapper, close() leaves the master running.
+
+    :param host_ip: Target Host for the payloads
+    :param username: User name to log in as
+    :param control_dir: Directory holding the ControlMaster sockets
+    :param timeout: How long the client can attempt to connect to the remote host
+    :param control_persist: Seconds the master connection stays open after its last use
+    :param command_timeout: Seconds run() waits for a payload to finish before reporting a connection error
+    """
+
+    def __init__(
+            self,
+            host_ip,
+            username,
+            control_dir,
+            timeout=4,
+            control_persist=600,
+            command_timeout=SSH_COMMAND_TIMEOUT,
+    ):
+        self.host_ip = host_ip
+        self.username = username
+        self.command_timeout = command_timeout
+        self.last_used = time.monotonic()
+        self.command = [
+            'ssh',
+            '-l', username,
+            '-o', 'BatchMode=yes',
+            '-o', 'StrictHostKeyChecking=accept-new',
+            '-o', f'ConnectTimeout={timeout}',
+            '-o', 'ControlMaster=auto',
+            '-o', f'ControlPath={control_dir}/cm-%C',
+            '-o', f'ControlPersist={control_persist}',
+            host_ip,
+        ]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Does nothing, the master connection is meant to outlive this object and closes itself once idle.
+        """
+
+    def run(self, payload):
+        """
+        Runs a command over the shared master connection, starting it first if needed.
+        :param payload: the command to run.
+        :return: RCC response dict, as returned by comms_ssh()
+        """
+        self.last_used = time.monotonic()
+        response = deepcopy(RESPONSE_DICT)
+        try:
+            result = subprocess.run(
+                self.command + [payload],
+                capture_output=True,
+                text=True,
+                timeout=self.command_timeout,
+            )
+        except OSError as e:
+            response['channel_code'] = CONNECTION_ERROR
+            response['channel_message'] = f'Could not run the ssh client to connect to {self.host_ip}.'
+            response['channel_error'] = str(e)
+            return response
+        except subprocess.TimeoutExpired as e:
+            # the ssh client is killed, the remote command may still be running
+            response['channel_code'] = CONNECTION_ERROR
+            response['channel_message'] = (
+                f'Timed out after {self.command_timeout} seconds waiting for the payload to finish on {self.host_ip}.'
+            )
+            response['channel_error'] = str(e)
+            return response
+
+        # ssh reserves exit status 255 for its own errors, although a remote command exiting 255 is reported the
+        # same way and cannot be told apart from them
+        if result.returncode == 255:
+            response['channel_code'] = CONNECTION_ERROR
+            response['channel_message'] = (
+                f'Could not establish a SSH connection to {self.host_ip} for username {self.username}.'
+            )
+            response['channel_error'] = result.stderr
+            return response
+
+        response['channel_code'] = CHANNEL_SUCCESS
+        response['channel_message'] = f'Connection established to IP {self.host_ip}'
+        response['payload_code'] = result.returncode
+        response['payload_message'] = result.stdout
+        response['payload_error'] = result.stderr
+
+        return response
+
+
+class PersistentSSHCommsWrapper:
+    """
+    Drop-in replacement for SSHCommsWrapper(comms_ssh_tuned, host_ip, username) that keeps the SSH connection open
+    between payloads. Only the first run() pays for the TCP handshake, key exchange and authentication, every
+    payload after that is a new channel on the same connection. A connection that has dropped is re-established
+    on the next run().
+
+    Use it as a context manager or call close() once all payloads have been run. Instances are thread safe,
+    concurrent run() calls become concurrent channels on the one connection. get_ssh_session() hands out
+    instances that are shared by all callers in the process.
+
+    :param host_ip: Target Host for the payloads
+    :param username: User name to log in as
+    :param timeout: How long the client can attempt to connect to the remote host
+    """
+
+    def __init__(self, host_ip, username, timeout=4):
+        self.host_ip = host_ip
+        self.username = username
+        self.timeout = timeout
+        self.client = None
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Closes the SSH connection, if open.
+        """
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+    def _connect(self):
+        """
+        Returns a live client, (re)connecting if needed, or None and an RCC response describing the failure.
+        Must be called with self._lock held.
+        """
+        if self.client is not None:
+            transport = self.client.get_transport()
+            if transport is None or not transport.is_active():
+                self._close()
+
+        if self.client is None:
+            response = deepcopy(RESPONSE_DICT)
+            try:
+                ip = ipaddress.ip_address(self.host_ip)
+            except ValueError as e:
+                response['channel_code'] = VALIDATION_ERROR
+                response['channel_message'] = f'Could not parse sent `host_ip` value {self.host_ip}'
+                response['channel_error'] = str(e)
+                return None, response
+
+            self.client, err = _get_tuned_client(ip, self.username, self.timeout)
+            if err is not None:
+                response['channel_code'] = CONNECTION_ERROR
+                response['channel_message'] = (
+                    f'Could not establish a SSH connection to {self.host_ip} for username {self.username}.'
+                )
+                response['channel_error'] = err
+                return None, response
+
+        return self.client, None
+
+    def run(self, payload):
+        """
+        Runs a command over the persistent connection, opening it first if needed.
+        :param payload: the command to run.
+        :return: RCC response dict, as returned by comms_ssh()
+        """
+        with self._lock:
+            client, response = self._connect()
+            self.last_used = time.monotonic()
+        if client is None:
+            return response
+
+        response = deepcopy(RESPONSE_DICT)
+        try:
+            exit_code, out, err = _exec_paramiko(client, payload)
+        except (SSHException, OSError) as e:
+            # the connection went away between the liveness check and opening the channel
+            with self._lock:
+                if self.client is client:
+                    self._close()
+            response['channel_code'] = CONNECTION_ERROR
+            response['channel_message'] = f'Lost the SSH connection to {self.host_ip} for username {self.username}.'
+            response['channel_error'] = str(e)
+            return response
+
+        response['channel_code'] = CHANNEL_SUCCESS
+        response['channel_message'] = f'Connection established to IP {self.host_ip}'
+        response['payload_code'] = exit_code
+        response['payload_message'] = out
+        response['payload_error'] = err
+
+        return response
+
+
 class PodnetErrorFormatter:
     """Formats error messages occurring on PodNet nodes and keeps error/success message state if needed"""
 
@@ -330,7 +909,15 @@ class PodnetErrorFormatter:
         :param rcc_return: [optional] data structure returned from RCC. This will be
                            recorded as well and can be used for debugging.
         """
-        self.successful_payloads[self.podnet_node].append({
+        self.record_successful(self.successful_payloads, self.podnet_node, payload_name, rcc_return)
+
+    @staticmethod
+    def record_successful(successful_payloads, podnet_node, payload_name, rcc_return=None):
+        """
+        Records a payload as having run successfully on podnet_node in successful_payloads, like add_successful()
+        does, for callers that only create a formatter once a payload has failed.
+        """
+        successful_payloads.setdefault(podnet_node, []).append({
             'payload_name': payload_name,
             'rcc_return': rcc_return,
         })
@@ -13,7 +13,8 @@ setup(
     license="Apache 2.0",
     install_requires=[
         "cloudcix>=0.15.2",
-        "jinja2"
+        "jinja2",
+        "paramiko",
     ],
     packages=find_packages(),
     include_package_data=True,